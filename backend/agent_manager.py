@@ -1,36 +1,121 @@
 import asyncio
+import contextlib
 import logging
 import time
+from collections import OrderedDict
 from collections.abc import AsyncGenerator
-from contextlib import AsyncExitStack
 from dataclasses import dataclass, field
 
 from groq import APIError
 from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import AIMessage, HumanMessage
 from langchain_groq import ChatGroq
-from langchain_mcp_adapters.sessions import create_session
-from langchain_mcp_adapters.tools import load_mcp_tools
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.answer_cache import answer_cache, replay_tokens
 from backend.config import settings
-from backend.services.chat_service import add_message, get_conversation_history
-from backend.tool_utils import wrap_tool, friendly_error, check_guardrail
+from backend.database import release_connection
+from backend.mcp_pool import MCPSessionPool
+from backend.memory import ConversationMemory, Position
+from backend.models import Message
+from backend.services.chat_service import (
+    MessageQueueFullError,
+    add_message,
+    get_conversation_history,
+    get_memory_summary,
+    save_memory_summary,
+)
+from backend.tool_utils import ToolRun, check_guardrail, friendly_error, track_tool_run, wrap_tool
 
 logger = logging.getLogger(__name__)
 
+# AgentExecutor's final output when it stops at AGENT_MAX_ITERATIONS
+_ITERATION_LIMIT_OUTPUT = "Agent stopped due to"
+
+
+def _position(message: Message) -> Position:
+    return message.created_at, message.id
+
 
 @dataclass
-class CachedExecutor:
-    """An AgentExecutor with its memory and lock, cached per conversation."""
-    executor: AgentExecutor
-    memory: ConversationBufferMemory
+class CachedConversation:
+    """Per-conversation agent state — memory and lock. The agent itself is shared."""
+    memory: ConversationMemory
     lock: asyncio.Lock = field(default_factory=asyncio.Lock)
     last_used: float = field(default_factory=time.monotonic)
 
 
+class ConversationCache:
+    """Bounded LRU of per-conversation agent state.
+
+    Entries are kept in last-used order, so touch and evict are O(1): eviction
+    only ever looks at the least recently used end. Entries past the TTL or
+    beyond the size cap are evicted, but never one whose lock is held."""
+
+    def __init__(self):
+        self._entries: OrderedDict[str, CachedConversation] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: str) -> CachedConversation | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self.touch(key)
+        return entry
+
+    def peek(self, key: str) -> CachedConversation | None:
+        return self._entries.get(key)
+
+    def touch(self, key: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(key)
+
+    def put(self, key: str, entry: CachedConversation) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self.evict()
+
+    def pop(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def evict(self) -> None:
+        """Evict from the LRU end while entries are stale or over the size cap."""
+        now = time.monotonic()
+        in_use = 0
+        while len(self._entries) > in_use:
+            key, entry = next(iter(self._entries.items()))
+            over_cap = len(self._entries) > settings.EXECUTOR_CACHE_MAX_ENTRIES
+            stale = now - entry.last_used > settings.EXECUTOR_TTL_SECONDS
+            if not (over_cap or stale):
+                break
+            if entry.lock.locked():
+                # A stream is running on it — it is in use, so treat it as fresh
+                self.touch(key)
+                in_use += 1
+                continue
+            del self._entries[key]
+            self._evictions += 1
+            logger.info(f"Evicted {'stale' if stale else 'LRU'} conversation: {key}")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": settings.EXECUTOR_CACHE_MAX_ENTRIES,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
 class AgentManager:
     """Singleton managing shared LLM + MCP tools, with per-conversation streaming."""
 
@@ -38,12 +123,14 @@ class AgentManager:
         self.llm: ChatGroq | None = None
         self.tools: list = []
         self._tool_map: dict = {}
-        self._executors: dict[str, CachedExecutor] = {}
-        self._exit_stack: AsyncExitStack | None = None
+        self._executor: AgentExecutor | None = None
+        self._conversations = ConversationCache()
+        self._pools: dict[str, MCPSessionPool] = {}
+        self._background: set[asyncio.Task] = set()  # memory compactions
         self._initialized = False
 
     async def initialize(self):
-        """Initialize LLM and persistent MCP sessions. Called once at startup."""
+        """Initialize LLM and pooled persistent MCP sessions. Called once at startup."""
         if self._initialized:
             return
 
@@ -54,37 +141,62 @@ class AgentManager:
             temperature=settings.LLM_TEMPERATURE,
         )
 
-        # Open persistent MCP sessions via AsyncExitStack so they stay alive
-        # until shutdown() is called.
-        self._exit_stack = AsyncExitStack()
+        # Open a pool of persistent MCP sessions per server; they stay alive
+        # (and are respawned if they die) until shutdown() is called.
         all_tools = []
 
         for server_name, connection in settings.mcp_servers.items():
+            size = settings.MCP_POOL_SIZE.get(server_name, 1)
+            pool = MCPSessionPool(server_name, connection, size)
             try:
-                session = await self._exit_stack.enter_async_context(
-                    create_session(connection)
-                )
-                await session.initialize()
-                tools = await load_mcp_tools(session)
+                await pool.start()
+                tools = pool.tools()
                 all_tools.extend(tools)
-                logger.info(f"MCP server '{server_name}' connected ({len(tools)} tools)")
+                self._pools[server_name] = pool
+                logger.info(
+                    f"MCP server '{server_name}' connected "
+                    f"({len(tools)} tools, {size} sessions)"
+                )
             except Exception:
                 logger.exception(f"Failed to connect to MCP server '{server_name}'")
+                await pool.close()
 
         filtered = [t for t in all_tools if t.name in settings.REQUIRED_TOOLS]
         self.tools = [wrap_tool(t) for t in filtered]
         self._tool_map = {t.name: t for t in self.tools}
 
+        # One agent for every conversation: the symbol and stock name are prompt
+        # variables, so tool schemas are bound to the LLM once, not per conversation.
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", settings.SYSTEM_PROMPT),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}"),
+            MessagesPlaceholder(variable_name="agent_scratchpad"),
+        ])
+        agent = create_tool_calling_agent(
+            llm=self.llm, tools=self.tools, prompt=prompt
+        )
+        self._executor = AgentExecutor(
+            agent=agent,
+            tools=self.tools,
+            verbose=False,
+            handle_parsing_errors=True,
+            max_iterations=settings.AGENT_MAX_ITERATIONS,
+        )
+
         logger.info(f"AgentManager ready. Tools: {list(self._tool_map.keys())}")
         self._initialized = True
 
     async def shutdown(self):
         """Gracefully close all MCP sessions and their subprocesses."""
-        if self._exit_stack:
+        for task in list(self._background):
+            task.cancel()
+        if self._pools:
             logger.info("Shutting down MCP sessions...")
-            await self._exit_stack.aclose()
-            self._exit_stack = None
-        self._executors.clear()
+            for pool in self._pools.values():
+                await pool.close()
+            self._pools.clear()
+        self._conversations.clear()
         self._initialized = False
         logger.info("AgentManager shut down.")
 
@@ -98,71 +210,46 @@ class AgentManager:
         result = await tool.ainvoke(arguments)
         return result
 
+    def pool_stats(self) -> dict:
+        """Per-server MCP session pool health and load."""
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
     # ── Streaming chat (for WebSocket) ───────────────────────────────────────
 
     def _cache_key(self, session_id: str, symbol: str) -> str:
         return f"{session_id}_{symbol}"
 
-    async def _get_or_create_executor(
+    async def _get_or_create_conversation(
         self,
         db: AsyncSession,
         session_id: str,
         symbol: str,
-        stock_name: str,
-    ) -> CachedExecutor:
-        """Return a cached executor for this session+symbol, or build a new one."""
+    ) -> CachedConversation:
+        """Return cached memory + lock for this session+symbol, or build them."""
         key = self._cache_key(session_id, symbol)
-        cached = self._executors.get(key)
+        cached = self._conversations.get(key)
         if cached is not None:
-            cached.last_used = time.monotonic()
             return cached
 
-        # Cold start: build memory from stored history
-        history = await get_conversation_history(db, session_id, symbol)
-        memory = ConversationBufferMemory(
-            memory_key="chat_history", return_messages=True
+        # Cold start: the persisted summary of older turns, plus the stored
+        # messages it doesn't cover yet (at most the window memory keeps)
+        summary, folded_through = await get_memory_summary(db, session_id, symbol)
+        history = await get_conversation_history(
+            db, session_id, symbol, limit=ConversationMemory.history_limit(), after=folded_through
         )
-        for msg in history:
-            if msg["role"] == "user":
-                memory.chat_memory.add_message(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                memory.chat_memory.add_message(AIMessage(content=msg["content"]))
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", settings.SYSTEM_PROMPT.format(symbol=symbol, stock_name=stock_name)),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
 
-        agent = create_tool_calling_agent(
-            llm=self.llm, tools=self.tools, prompt=prompt
-        )
-        executor = AgentExecutor(
-            agent=agent,
-            tools=self.tools,
-            memory=memory,
-            verbose=False,
-            handle_parsing_errors=True,
-            max_iterations=settings.AGENT_MAX_ITERATIONS,
-        )
+        # Another message for this conversation may have built it while we awaited
+        cached = self._conversations.peek(key)
+        if cached is not None:
+            return cached
+        memory = ConversationMemory(self.llm)
+        memory.restore(summary, folded_through, history)
 
-        entry = CachedExecutor(executor=executor, memory=memory)
-        self._executors[key] = entry
-        logger.info(f"Created new executor for session={session_id}, symbol={symbol}")
+        entry = CachedConversation(memory=memory)
+        self._conversations.put(key, entry)
+        logger.info(f"Loaded conversation memory for session={session_id}, symbol={symbol}")
         return entry
 
-    def _evict_stale_executors(self) -> None:
-        """Remove executors (and their locks) that haven't been used within the TTL."""
-        now = time.monotonic()
-        stale = [
-            key for key, entry in self._executors.items()
-            if now - entry.last_used > settings.EXECUTOR_TTL_SECONDS
-        ]
-        for key in stale:
-            del self._executors[key]
-            logger.info(f"Evicted stale executor: {key}")
-
     async def chat_stream(
         self,
         db: AsyncSession,
@@ -178,20 +265,39 @@ class AgentManager:
         Yields:
             Dicts with type: token | tool_start | tool_end | retry | done | error
         """
-        self._evict_stale_executors()
+        self._conversations.evict()
 
         stock_name = symbol.split(".")[0] if "." in symbol else symbol
 
-        cached = await self._get_or_create_executor(db, session_id, symbol, stock_name)
+        cached = await self._get_or_create_conversation(db, session_id, symbol)
 
         async with cached.lock:
             try:
-                await add_message(db, session_id, symbol, "user", user_message)
+                user_row = await add_message(db, session_id, symbol, "user", user_message)
+                # Don't hold a pool connection while the LLM streams
+                await release_connection(db)
 
-                executor = cached.executor
+                executor = self._executor
                 memory = cached.memory
 
+                # Opening questions (no prior history) may be answered from cache
+                cacheable = settings.ANSWER_CACHE_ENABLED and not memory.messages
+                if cacheable:
+                    hit = answer_cache.get(symbol, user_message)
+                    if hit is not None:
+                        logger.info(f"[STREAM:{symbol}] ANSWER CACHE HIT for session={session_id}")
+                        for token in replay_tokens(hit.response):
+                            yield {"type": "token", "content": token}
+                        full_response = hit.response + hit.disclaimer
+                        ai_row = await add_message(db, session_id, symbol, "assistant", full_response)
+                        memory.add_turn(user_message, full_response, _position(user_row), _position(ai_row))
+                        yield {"type": "done", "full_response": full_response, "disclaimer": hit.disclaimer}
+                        return
+
                 full_response = ""
+                tools_used: set[str] = set()
+                run = ToolRun()
+                hit_iteration_limit = False
                 agent_input = user_message
                 max_retries = settings.MAX_STREAM_RETRIES
                 stream_start = time.monotonic()
@@ -203,6 +309,9 @@ class AgentManager:
 
                 for attempt in range(1, max_retries + 1):
                     full_response = ""
+                    tools_used.clear()
+                    run = track_tool_run()
+                    hit_iteration_limit = False
                     attempt_start = time.monotonic()
 
                     if attempt > 1:
@@ -212,7 +321,12 @@ class AgentManager:
 
                     try:
                         async for event in executor.astream_events(
-                            {"input": agent_input, "chat_history": memory.chat_memory.messages},
+                            {
+                                "input": agent_input,
+                                "chat_history": memory.messages,
+                                "symbol": symbol,
+                                "stock_name": stock_name,
+                            },
                             version="v2",
                         ):
                             kind = event["event"]
@@ -225,12 +339,23 @@ class AgentManager:
 
                             elif kind == "on_tool_start":
                                 logger.info(f"[STREAM:{symbol}] Tool started: {event.get('name', '')}")
+                                tools_used.add(event.get("name", ""))
                                 yield {"type": "tool_start", "tool_name": event.get("name", "")}
 
                             elif kind == "on_tool_end":
                                 logger.info(f"[STREAM:{symbol}] Tool ended: {event.get('name', '')}")
                                 yield {"type": "tool_end", "tool_name": event.get("name", "")}
 
+                            elif kind == "on_tool_error":
+                                run.degraded.add(event.get("name", ""))
+
+                            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                                output = event["data"].get("output")
+                                if isinstance(output, dict) and str(output.get("output", "")).startswith(
+                                    _ITERATION_LIMIT_OUTPUT
+                                ):
+                                    hit_iteration_limit = True
+
                         # Stream completed successfully
                         elapsed = time.monotonic() - stream_start
                         logger.info(
@@ -272,15 +397,31 @@ class AgentManager:
                 # Guardrail: check for trading advice, append disclaimer if flagged
                 disclaimer = ""
                 if full_response:
+                    answer = full_response
                     checked = check_guardrail(full_response)
                     if checked != full_response:
                         # Guardrail appended a disclaimer
                         disclaimer = checked[len(full_response):]
                         full_response = checked
-                    await add_message(db, session_id, symbol, "assistant", full_response)
+                    ai_row = await add_message(db, session_id, symbol, "assistant", full_response)
+                    memory.add_turn(user_message, full_response, _position(user_row), _position(ai_row))
+                    # Never replay a degraded answer to every user for the whole TTL
+                    if cacheable and (run.degraded or hit_iteration_limit):
+                        logger.info(
+                            f"[STREAM:{symbol}] Not caching answer — "
+                            f"{'iteration limit hit' if hit_iteration_limit else f'degraded tools: {sorted(run.degraded)}'}"
+                        )
+                    elif cacheable:
+                        answer_cache.put(
+                            symbol, user_message, answer, disclaimer, tools_used, run.data_expires_at
+                        )
 
                 yield {"type": "done", "full_response": full_response, "disclaimer": disclaimer}
 
+                # In the background, so neither this client nor the next message
+                # on the conversation waits on the summary LLM call
+                self._schedule_compaction(session_id, symbol, memory)
+
             except Exception as e:
                 total_elapsed = time.monotonic() - stream_start if 'stream_start' in dir() else 0
                 logger.error(
@@ -289,13 +430,39 @@ class AgentManager:
                     exc_info=True,
                 )
                 friendly = friendly_error(e)
-                await add_message(db, session_id, symbol, "assistant", friendly)
+                # The failure may be the message queue itself refusing writes
+                with contextlib.suppress(MessageQueueFullError):
+                    await add_message(db, session_id, symbol, "assistant", friendly)
                 yield {"type": "error", "content": friendly}
 
-    def remove_executor(self, session_id: str, symbol: str) -> None:
-        """Remove cached executor (and its lock) for a conversation."""
+        # Count the end of a long stream as use, not just its start
+        self._conversations.touch(self._cache_key(session_id, symbol))
+
+    def _schedule_compaction(self, session_id: str, symbol: str, memory: ConversationMemory) -> None:
+        task = asyncio.create_task(self._compact_memory(session_id, symbol, memory))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _compact_memory(self, session_id: str, symbol: str, memory: ConversationMemory) -> None:
+        """Fold old turns into the summary and persist it for cold starts."""
+        try:
+            if await memory.compact():
+                await save_memory_summary(session_id, symbol, memory.summary, memory.folded_through)
+        except Exception:
+            logger.exception(f"[MEMORY] Compaction failed for session={session_id}, symbol={symbol}")
+
+    def remove_conversation(self, session_id: str, symbol: str) -> None:
+        """Remove cached memory (and its lock) for a conversation."""
         key = self._cache_key(session_id, symbol)
-        self._executors.pop(key, None)
+        self._conversations.pop(key)
+
+    def answer_cache_stats(self) -> dict:
+        """First-turn answer cache size and hit/miss counters."""
+        return answer_cache.stats()
+
+    def conversation_stats(self) -> dict:
+        """Conversation cache size and hit/miss/eviction counters."""
+        return self._conversations.stats()
 
 
 # Singleton instance
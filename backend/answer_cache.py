@@ -0,0 +1,101 @@
+"""Exact-match cache of first-turn agent answers, keyed by symbol + normalized question."""
+
+import logging
+import re
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    response: str  # agent output, without the guardrail disclaimer
+    disclaimer: str
+    expires_at: float  # time.monotonic
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return " ".join(question.lower().split()).rstrip(" ?!.")
+
+
+def replay_tokens(text: str) -> Iterator[str]:
+    """Split a cached answer into word-sized chunks to replay it as a token stream."""
+    yield from re.findall(r"\s*\S+|\s+", text)
+
+
+class AnswerCache:
+    """LRU cache of answers to opening questions (no prior history).
+
+    An answer expires when the first tool result behind it would have: the
+    earliest cached_at + TTL over the results the agent saw, so an answer
+    built on a cache hit near the end of its TTL expires with that entry,
+    not a full TTL later. Answers that used a tool without a cache TTL, or
+    whose data has already expired, are not stored."""
+
+    def __init__(self):
+        self._entries: OrderedDict[str, CachedAnswer] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def _key(self, symbol: str, question: str) -> str:
+        return f"{symbol}:{normalize_question(question)}"
+
+    def get(self, symbol: str, question: str) -> CachedAnswer | None:
+        key = self._key(symbol, question)
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry
+
+    def put(
+        self,
+        symbol: str,
+        question: str,
+        response: str,
+        disclaimer: str,
+        tools_used: set[str],
+        data_expires_at: float | None = None,
+    ) -> None:
+        """Store an answer. `data_expires_at` (time.time) is when the oldest tool
+        result behind it stops being fresh — see tool_utils.ToolRun."""
+        if tools_used:
+            ttl = min(settings.TOOL_CACHE_TTL.get(name, 0) for name in tools_used)
+            if data_expires_at is not None:
+                ttl = min(ttl, data_expires_at - time.time())
+        else:
+            ttl = settings.ANSWER_CACHE_TTL
+        if ttl <= 0:
+            return
+
+        key = self._key(symbol, question)
+        self._entries[key] = CachedAnswer(
+            response=response, disclaimer=disclaimer, expires_at=time.monotonic() + ttl
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > settings.ANSWER_CACHE_MAX_ENTRIES:
+            self._entries.popitem(last=False)
+        logger.debug(f"[ANSWER_CACHE] Stored answer, key={key[:80]}, ttl={ttl:.0f}s")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,74 @@
+"""Benchmark json_utils.loads on a NaN-bearing fundamentals-style payload.
+
+Checks the result against the stdlib parser (NaN/Infinity -> None) first,
+then times both (best of 5 rounds). Run from the project root:
+
+    python -m backend.benchmarks.json_loads
+"""
+
+import json
+import random
+import timeit
+
+from backend import json_utils
+
+ROUNDS = 50
+
+
+def _non_finite(_: str) -> None:
+    return None
+
+
+def make_payload(seed: int = 1) -> str:
+    """~150 KB of JSON shaped like get_stock_fundamentals' tool output: an
+    info dict (with NaN/Infinity inside strings too), statement tables with
+    ~20% NaN cells, and a year of daily history."""
+    rng = random.Random(seed)
+    info = {
+        f"field{i}": rng.random() * 1e6 if i % 3 else f'text {i}: NaN, "quoted" -Infinity \\ {i}'
+        for i in range(200)
+    }
+    info["longBusinessSummary"] = "Lorem ipsum dolor sit amet. " * 200
+    info["trailingPE"] = float("nan")
+    info["pegRatio"] = float("inf")
+    info["debtToEquity"] = float("-inf")
+    table = {
+        f"20{year}-03-31": {
+            f"Line item {row}": float("nan") if rng.random() < 0.2 else rng.random() * 1e9
+            for row in range(80)
+        }
+        for year in range(10, 24)
+    }
+    history = [
+        {"Date": f"2024-01-{day % 28 + 1:02d}", "Close": rng.random() * 1000, "Volume": rng.randrange(10**7)}
+        for day in range(250)
+    ]
+    return json.dumps({
+        "info": info,
+        "financials": table,
+        "balance_sheet": table,
+        "cashflow": table,
+        "history": history,
+    })
+
+
+def main() -> None:
+    payload = make_payload()
+    expected = json.loads(payload, parse_constant=_non_finite)
+    assert json_utils.loads(payload) == expected, "loads() disagrees with the stdlib parser"
+    assert json_utils.loads(payload.encode()) == expected, "loads(bytes) disagrees with the stdlib parser"
+
+    clean = json_utils.dumps(expected)
+    timings = {
+        "stdlib json.loads (NaN payload)": lambda: json.loads(payload, parse_constant=_non_finite),
+        "json_utils.loads (NaN payload)": lambda: json_utils.loads(payload),
+        "json_utils.loads (same data, no NaN)": lambda: json_utils.loads(clean),
+    }
+    print(f"payload: {len(payload) / 1024:.0f} KB, {payload.count('NaN')} NaN literals")
+    for name, fn in timings.items():
+        ms = min(timeit.repeat(fn, number=ROUNDS, repeat=5)) / ROUNDS * 1000
+        print(f"  {name:<40} {ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""Storage backends for ToolCache — per-process memory, or a SQLite file shared by workers."""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Protocol
+
+import aiosqlite
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    result: Any
+    cached_at: float  # time.time — wall clock, so it is comparable across processes
+    tool_name: str = ""
+    size: int = 0  # estimated bytes
+
+
+class CacheBackend(Protocol):
+    """Key/value storage behind ToolCache. Freshness rules live in ToolCache.
+
+    Storage calls are async so a backend doing I/O never blocks the event loop.
+    stats() is sync and must not do I/O — it backs /api/health."""
+
+    async def get(self, key: str) -> CacheEntry | None: ...
+
+    async def put(self, key: str, entry: CacheEntry) -> None: ...
+
+    async def delete(self, key: str) -> None: ...
+
+    async def sweep(self, cutoff: float) -> int:
+        """Drop entries cached before `cutoff` and enforce size bounds. Returns entries expired."""
+        ...
+
+    def stats(self) -> dict: ...
+
+    async def clear(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+def _max_entries(tool_name: str) -> int:
+    return settings.TOOL_CACHE_MAX_ENTRIES.get(tool_name, settings.TOOL_CACHE_DEFAULT_MAX_ENTRIES)
+
+
+# ── In-memory backend ────────────────────────────────────────────────────────
+
+def _estimate_size(value: Any) -> int:
+    """Rough in-memory size of a cached result, in bytes."""
+    if isinstance(value, (str, bytes)):
+        return sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(_estimate_size(v) for v in value)
+    if value is None:
+        return 0
+    return len(json.dumps(value, default=str))
+
+
+class MemoryCacheBackend:
+    """Per-process LRU store, bounded per tool and by a global byte budget."""
+
+    def __init__(self):
+        self._store: OrderedDict[str, CacheEntry] = OrderedDict()  # global LRU order
+        self._tool_keys: dict[str, OrderedDict[str, None]] = {}  # per-tool LRU order
+        self._bytes = 0
+        self._evictions = 0
+
+    async def get(self, key: str) -> CacheEntry | None:
+        entry = self._store.get(key)
+        if entry is not None:
+            self._store.move_to_end(key)
+            self._tool_keys[entry.tool_name].move_to_end(key)
+        return entry
+
+    async def put(self, key: str, entry: CacheEntry) -> None:
+        entry.size = _estimate_size(entry.result)
+        if entry.size > settings.TOOL_CACHE_MAX_BYTES:
+            logger.warning(
+                f"[CACHE:{entry.tool_name}] Result too large to cache ({entry.size} bytes), skipping"
+            )
+            return
+
+        self._delete(key)
+        self._store[key] = entry
+        tool_keys = self._tool_keys.setdefault(entry.tool_name, OrderedDict())
+        tool_keys[key] = None
+        self._bytes += entry.size
+
+        # Per-tool entry limit, then the global byte budget — LRU first in both
+        while len(tool_keys) > _max_entries(entry.tool_name):
+            self._evict(next(iter(tool_keys)))
+        while self._bytes > settings.TOOL_CACHE_MAX_BYTES:
+            self._evict(next(iter(self._store)))
+
+    async def delete(self, key: str) -> None:
+        self._delete(key)
+
+    def _delete(self, key: str) -> None:
+        entry = self._store.pop(key, None)
+        if entry is not None:
+            self._tool_keys[entry.tool_name].pop(key, None)
+            self._bytes -= entry.size
+
+    def _evict(self, key: str) -> None:
+        self._delete(key)
+        self._evictions += 1
+        logger.debug(f"[CACHE] Evicted LRU entry, key={key[:80]}")
+
+    async def sweep(self, cutoff: float) -> int:
+        expired = [key for key, entry in self._store.items() if entry.cached_at < cutoff]
+        for key in expired:
+            self._delete(key)
+        return len(expired)
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "entries": len(self._store),
+            "bytes": self._bytes,
+            "entries_per_tool": {name: len(keys) for name, keys in self._tool_keys.items()},
+            "evictions": self._evictions,
+        }
+
+    async def clear(self) -> None:
+        self._store.clear()
+        self._tool_keys.clear()
+        self._bytes = 0
+
+    async def close(self) -> None:
+        pass
+
+
+# ── SQLite backend (shared across workers and restarts) ──────────────────────
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tool_cache (
+    key TEXT PRIMARY KEY,
+    tool_name TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    cached_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_tool_cache_tool_cached_at ON tool_cache (tool_name, cached_at);
+CREATE INDEX IF NOT EXISTS ix_tool_cache_cached_at ON tool_cache (cached_at);
+"""
+
+
+def _encode(result: Any) -> str | None:
+    """JSON-encode a result, remembering whether the top level was a tuple
+    (MCP tools return (content, artifact) tuples). None if not serializable."""
+    try:
+        return json.dumps({"tuple": isinstance(result, tuple), "value": result})
+    except (TypeError, ValueError):
+        return None
+
+
+def _decode(payload: str) -> Any:
+    """Inverse of _encode. Raises ValueError for a payload it can't read."""
+    try:
+        data = json.loads(payload)
+        return tuple(data["value"]) if data["tuple"] else data["value"]
+    except (TypeError, KeyError, ValueError) as e:
+        raise ValueError(f"unreadable cache payload: {e}") from e
+
+
+class SQLiteCacheBackend:
+    """Tool cache in a local SQLite file (WAL mode), shared by every uvicorn
+    worker on the host and surviving restarts.
+
+    Queries run through aiosqlite on its own thread, so a locked file or a WAL
+    checkpoint never stalls the event loop. Size bounds are enforced by the
+    sweeper, evicting the oldest entries first. SQLite errors and unreadable
+    rows degrade to cache misses — the cache must never fail a tool call."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._conn: aiosqlite.Connection | None = None
+        self._connect_lock = asyncio.Lock()
+        self._evictions = 0
+        # Refreshed by sweep(), so stats() needs no query
+        self._entries: int | None = None
+        self._bytes: int | None = None
+        self._entries_per_tool: dict[str, int] = {}
+
+    async def _connection(self) -> aiosqlite.Connection:
+        async with self._connect_lock:
+            if self._conn is None:
+                conn = await aiosqlite.connect(
+                    self._path,
+                    timeout=settings.TOOL_CACHE_SQLITE_TIMEOUT,
+                    isolation_level=None,  # autocommit
+                )
+                await conn.execute("PRAGMA journal_mode=WAL")
+                await conn.execute("PRAGMA synchronous=NORMAL")
+                await conn.executescript(_SQLITE_SCHEMA)
+                self._conn = conn
+                logger.info(f"[CACHE] Using shared SQLite tool cache at {self._path}")
+            return self._conn
+
+    async def get(self, key: str) -> CacheEntry | None:
+        try:
+            conn = await self._connection()
+            async with conn.execute(
+                "SELECT tool_name, payload, cached_at, size FROM tool_cache WHERE key = ?",
+                (key,),
+            ) as cursor:
+                row = await cursor.fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"[CACHE] SQLite read failed — {type(e).__name__}: {e}")
+            return None
+        if row is None:
+            return None
+        tool_name, payload, cached_at, size = row
+        try:
+            result = _decode(payload)
+        except ValueError as e:
+            # Corrupt or written by an older format — drop it and treat as a miss
+            logger.warning(f"[CACHE] Dropping unreadable entry, key={key[:80]} — {e}")
+            await self.delete(key)
+            return None
+        return CacheEntry(result=result, cached_at=cached_at, tool_name=tool_name, size=size)
+
+    async def put(self, key: str, entry: CacheEntry) -> None:
+        payload = _encode(entry.result)
+        if payload is None:
+            logger.debug(f"[CACHE:{entry.tool_name}] Result not JSON-serializable, skipping")
+            return
+        entry.size = len(payload)
+        if entry.size > settings.TOOL_CACHE_MAX_BYTES:
+            logger.warning(
+                f"[CACHE:{entry.tool_name}] Result too large to cache ({entry.size} bytes), skipping"
+            )
+            return
+        try:
+            conn = await self._connection()
+            await conn.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, tool_name, payload, cached_at, size) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, entry.tool_name, payload, entry.cached_at, entry.size),
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"[CACHE] SQLite write failed — {type(e).__name__}: {e}")
+
+    async def delete(self, key: str) -> None:
+        try:
+            conn = await self._connection()
+            await conn.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"[CACHE] SQLite delete failed — {type(e).__name__}: {e}")
+
+    async def sweep(self, cutoff: float) -> int:
+        try:
+            conn = await self._connection()
+            async with conn.execute("DELETE FROM tool_cache WHERE cached_at < ?", (cutoff,)) as cursor:
+                expired = cursor.rowcount
+
+            # Per-tool entry limits — keep the newest N of each tool
+            tools = [row[0] for row in await conn.execute_fetchall("SELECT DISTINCT tool_name FROM tool_cache")]
+            for tool_name in tools:
+                async with conn.execute(
+                    "DELETE FROM tool_cache WHERE tool_name = ? AND key NOT IN ("
+                    "SELECT key FROM tool_cache WHERE tool_name = ? ORDER BY cached_at DESC LIMIT ?)",
+                    (tool_name, tool_name, _max_entries(tool_name)),
+                ) as cursor:
+                    self._evictions += cursor.rowcount
+
+            # Global byte budget — drop the oldest entries until under it
+            ((total,),) = await conn.execute_fetchall("SELECT COALESCE(SUM(size), 0) FROM tool_cache")
+            if total > settings.TOOL_CACHE_MAX_BYTES:
+                excess = total - settings.TOOL_CACHE_MAX_BYTES
+                victims = []
+                async with conn.execute("SELECT key, size FROM tool_cache ORDER BY cached_at") as cursor:
+                    async for key, size in cursor:
+                        victims.append((key,))
+                        excess -= size
+                        if excess <= 0:
+                            break
+                await conn.executemany("DELETE FROM tool_cache WHERE key = ?", victims)
+                self._evictions += len(victims)
+
+            await self._refresh_stats(conn)
+            return expired
+        except sqlite3.Error as e:
+            logger.warning(f"[CACHE] SQLite sweep failed — {type(e).__name__}: {e}")
+            return 0
+
+    async def _refresh_stats(self, conn: aiosqlite.Connection) -> None:
+        ((self._entries, self._bytes),) = await conn.execute_fetchall(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tool_cache"
+        )
+        self._entries_per_tool = dict(
+            await conn.execute_fetchall("SELECT tool_name, COUNT(*) FROM tool_cache GROUP BY tool_name")
+        )
+
+    def stats(self) -> dict:
+        """Counts as of the last sweep."""
+        return {
+            "backend": "sqlite",
+            "entries": self._entries,
+            "bytes": self._bytes,
+            "entries_per_tool": self._entries_per_tool,
+            "evictions": self._evictions,
+        }
+
+    async def clear(self) -> None:
+        try:
+            conn = await self._connection()
+            await conn.execute("DELETE FROM tool_cache")
+        except sqlite3.Error as e:
+            logger.warning(f"[CACHE] SQLite clear failed — {type(e).__name__}: {e}")
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+def create_cache_backend() -> CacheBackend:
+    """Build the backend selected by TOOL_CACHE_BACKEND ("memory" or "sqlite")."""
+    if settings.TOOL_CACHE_BACKEND == "sqlite":
+        return SQLiteCacheBackend(settings.TOOL_CACHE_SQLITE_PATH)
+    if settings.TOOL_CACHE_BACKEND != "memory":
+        logger.warning(
+            f"Unknown TOOL_CACHE_BACKEND '{settings.TOOL_CACHE_BACKEND}', falling back to memory"
+        )
+    return MemoryCacheBackend()
@@ -0,0 +1,76 @@
+"""Per-router response compression (brotli or gzip, by Accept-Encoding)."""
+
+import gzip
+import importlib.util
+from collections.abc import Callable, Coroutine
+from typing import Any
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from fastapi.routing import APIRoute
+
+from backend.config import settings
+
+# brotli is optional (pip install brotli); without it only gzip is offered
+if importlib.util.find_spec("brotli") is not None:
+    import brotli
+else:
+    brotli = None
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    """Codings from an Accept-Encoding header, minus any refused with q=0."""
+    accepted = set()
+    for part in header.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip())
+    return accepted
+
+
+def compress_response(request: Request, response: Response) -> Response:
+    """Compress a buffered response body in place, if the client accepts it.
+
+    Streaming responses, already-encoded ones and bodies smaller than
+    COMPRESSION_MIN_SIZE are passed through untouched."""
+    if isinstance(response, StreamingResponse) or "content-encoding" in response.headers:
+        return response
+    body = getattr(response, "body", b"")
+    if len(body) < settings.COMPRESSION_MIN_SIZE:
+        return response
+
+    vary = response.headers.get("vary")
+    response.headers["vary"] = f"{vary}, Accept-Encoding" if vary else "Accept-Encoding"
+
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    if brotli is not None and "br" in accepted:
+        encoding, compressed = "br", brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    elif "gzip" in accepted:
+        encoding, compressed = "gzip", gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL)
+    else:
+        return response
+
+    response.body = compressed
+    response.headers["content-encoding"] = encoding
+    response.headers["content-length"] = str(len(compressed))
+    return response
+
+
+class CompressedRoute(APIRoute):
+    """APIRoute whose responses go through compress_response. Set it as a
+    router's route_class to compress just that router's endpoints."""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+
+        async def compressed_handler(request: Request) -> Response:
+            return compress_response(request, await handler(request))
+
+        return compressed_handler
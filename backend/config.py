@@ -22,10 +22,34 @@ class Settings(BaseSettings):
     # Agent
     AGENT_MAX_ITERATIONS: int = 5
     EXECUTOR_TTL_SECONDS: int = 30 * 60  # 30 minutes
+    EXECUTOR_CACHE_MAX_ENTRIES: int = 1000  # LRU cap on cached conversations
     MAX_STREAM_RETRIES: int = 2
     TOOL_CALL_RETRIES: int = 3
     TOOL_CALL_TIMEOUT: int = 30  # seconds
 
+    # Agent memory — "buffer" keeps every turn; "summary" keeps the last
+    # AGENT_MEMORY_WINDOW_TURNS turns verbatim plus a rolling LLM summary of
+    # older ones, capped at AGENT_MEMORY_MAX_TOKENS (estimated)
+    AGENT_MEMORY_MODE: str = "summary"
+    AGENT_MEMORY_WINDOW_TURNS: int = 6
+    AGENT_MEMORY_MAX_TOKENS: int = 3000
+
+    # MCP session pool — stdio sessions (subprocesses) per server, with
+    # least-loaded dispatch and health checks. Unlisted servers get one session.
+    MCP_POOL_SIZE: dict[str, int] = {
+        "stock_tools": 2,
+        "firecrawl-mcp": 1,
+    }
+    MCP_CONNECT_TIMEOUT: int = 60        # seconds for a session to spawn + initialize
+    MCP_HEALTH_CHECK_INTERVAL: int = 30  # seconds between pings
+    MCP_HEALTH_CHECK_TIMEOUT: int = 10   # seconds before a ping counts as failed
+
+    # Exact-match answer cache for opening questions (no prior history).
+    # Answers expire with the shortest TTL of the tools they used.
+    ANSWER_CACHE_ENABLED: bool = False
+    ANSWER_CACHE_TTL: int = 600  # seconds, for answers that used no tools
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+
     # Circuit breaker — disable a tool after N consecutive failures
     CIRCUIT_BREAKER_THRESHOLD: int = 5   # failures before tripping
     CIRCUIT_BREAKER_COOLDOWN: int = 300  # seconds before re-enabling (5 min)
@@ -38,6 +62,67 @@ class Settings(BaseSettings):
         "firecrawl_scrape": 1800,       # 30 min — web pages rarely change
     }
 
+    # Batch quotes (/api/stocks/quotes)
+    QUOTES_MAX_SYMBOLS: int = 50        # symbols per request
+    QUOTE_FANOUT_CONCURRENCY: int = 8   # cache misses fetched in parallel
+
+    # Response compression for the stock and chat history routes — brotli when
+    # the client accepts it and the brotli package is installed, else gzip
+    COMPRESSION_MIN_SIZE: int = 1024      # bytes; smaller bodies are sent as-is
+    COMPRESSION_GZIP_LEVEL: int = 5
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # Streaming quotes (/api/stocks/stream) — one shared poller per subscribed symbol.
+    # Pollers read through the tool cache, so a quote only changes once per
+    # TOOL_CACHE_TTL["get_stock_quote"]; polling faster than that just re-reads
+    # the cached entry. Lower both together for fresher streams.
+    QUOTE_STREAM_INTERVAL: float = 60.0   # seconds between polls of a symbol
+    QUOTE_STREAM_MAX_SYMBOLS: int = 50    # subscriptions per connection
+    QUOTE_STREAM_QUEUE_SIZE: int = 100    # pending updates per connection before the oldest is dropped
+
+    # Watchlist search — answered from an in-memory index of the symbol master;
+    # Yahoo autocomplete is only asked about queries the index can't answer.
+    # SYMBOL_MASTER_URL (NSE's equity list) is re-downloaded periodically; empty disables.
+    SYMBOL_MASTER_PATH: str = str(BASE_DIR / "data" / "symbols.csv")
+    SYMBOL_MASTER_URL: str = "https://archives.nseindia.com/content/equities/EQUITY_L.csv"
+    SYMBOL_MASTER_REFRESH_INTERVAL: int = 24 * 60 * 60  # seconds
+    YAHOO_SEARCH_CACHE_TTL: int = 3600          # seconds a remote search result is reused
+    YAHOO_SEARCH_CACHE_MAX_ENTRIES: int = 2000
+
+    # Shared outbound HTTP client (Yahoo search, symbol master) — keep-alive pool
+    HTTP_TIMEOUT: float = 10.0
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # seconds an idle connection stays open
+
+    # Stale-while-revalidate grace (seconds past TTL) — within it an expired entry
+    # is returned immediately and refreshed in the background. 0 disables.
+    TOOL_CACHE_SWR_GRACE: dict[str, int] = {
+        "get_stock_quote": 60,
+        "get_stock_fundamentals": 600,
+        "get_stock_news": 900,
+        "firecrawl_scrape": 1800,
+    }
+
+    # Tool cache bounds — LRU eviction per tool and against a global byte budget.
+    # Entries older than the stale horizon are swept, even as failure fallback.
+    TOOL_CACHE_MAX_ENTRIES: dict[str, int] = {
+        "get_stock_quote": 2000,
+        "get_stock_fundamentals": 500,
+        "get_stock_news": 500,
+        "firecrawl_scrape": 200,
+    }
+    TOOL_CACHE_DEFAULT_MAX_ENTRIES: int = 500
+    TOOL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 64 MB
+    TOOL_CACHE_STALE_HORIZON: int = 6 * 60 * 60   # 6 hours
+    TOOL_CACHE_SWEEP_INTERVAL: int = 60           # seconds
+
+    # Tool cache storage — "memory" (per process) or "sqlite" (one file shared
+    # by every worker on the host, survives restarts)
+    TOOL_CACHE_BACKEND: str = "memory"
+    TOOL_CACHE_SQLITE_PATH: str = str(BASE_DIR / "tool_cache.db")
+    TOOL_CACHE_SQLITE_TIMEOUT: float = 0.5  # seconds to wait on a locked file
+
     SYSTEM_PROMPT: str = (
         "You are analyzing {symbol} ({stock_name}).\n"
         "You are a helpful stock market assistant with access to real-time stock data, "
@@ -62,6 +147,13 @@ class Settings(BaseSettings):
         "Always present data clearly and explain your reasoning."
     )
 
+    MEMORY_SUMMARY_PROMPT: str = (
+        "You maintain a running summary of a conversation between a user and a stock "
+        "market assistant. Merge the new lines into the current summary. Keep the "
+        "stocks, figures, questions and conclusions discussed; drop greetings and "
+        "repetition. Reply with the updated summary only, in at most {max_words} words."
+    )
+
     GUARDRAIL_DISCLAIMER: str = (
         "\n\n---\n*This information is for educational and research purposes only. "
         "It does not constitute financial advice. Always consult a qualified financial "
@@ -75,7 +167,13 @@ class Settings(BaseSettings):
         "firecrawl_scrape",
     }
 
-    # Database — set DATABASE_URL directly (e.g. Render), or use individual fields
+    # Database — set DATABASE_URL directly (e.g. Render), or use individual fields.
+    # DB_ENGINE=sqlite runs on an embedded file instead (single-node deployments)
+    DB_ENGINE: str = "postgresql"  # "postgresql" or "sqlite"
+    SQLITE_PATH: str = str(BASE_DIR / "stock_assistant.db")
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # how long a writer waits on the write lock
+    SQLITE_CACHE_SIZE_KB: int = 65536   # page cache per connection
+    SQLITE_MMAP_SIZE: int = 268435456   # bytes of the file memory-mapped for reads
     DATABASE_URL: str = ""
     DB_USER: str = "postgres"
     DB_PASSWORD: str = "postgres"
@@ -83,6 +181,14 @@ class Settings(BaseSettings):
     DB_PORT: int = 5432
     DB_NAME: str = "stock_assistant"
 
+    # Connection pool
+    DB_POOL_SIZE: int = 5                  # connections kept open
+    DB_MAX_OVERFLOW: int = 10              # extra connections allowed under burst load
+    DB_POOL_TIMEOUT: float = 30.0          # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800            # seconds before a connection is replaced
+    DB_POOL_PRE_PING: bool = True          # test connections on checkout (drops dead ones; PostgreSQL only)
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100  # asyncpg, per connection; 0 disables (needed behind pgbouncer)
+
     @property
     def db_url(self) -> str:
         """Use DATABASE_URL if set, otherwise build from individual fields."""
@@ -91,9 +197,32 @@ class Settings(BaseSettings):
             # Render gives postgresql://, we need postgresql+asyncpg://
             if url.startswith("postgresql://"):
                 url = url.replace("postgresql://", "postgresql+asyncpg://", 1)
+            elif url.startswith("sqlite://"):
+                url = url.replace("sqlite://", "sqlite+aiosqlite://", 1)
             return url
+        if self.DB_ENGINE == "sqlite":
+            return f"sqlite+aiosqlite:///{self.SQLITE_PATH}"
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    # In-process caches of immutable IDs — skip the existence SELECT on hot paths
+    SESSION_CACHE_MAX_ENTRIES: int = 10_000           # known session IDs
+    CONVERSATION_ID_CACHE_MAX_ENTRIES: int = 10_000   # (session_id, symbol) -> conversation_id
+
+    # Write-behind chat message persistence
+    MESSAGE_FLUSH_INTERVAL: float = 0.05  # seconds a batch may wait before flushing
+    MESSAGE_FLUSH_MAX_BATCH: int = 200    # rows per multi-row INSERT
+    MESSAGE_RETRY_MAX_BACKOFF: float = 30.0  # cap on the wait between failed flushes (doubles per failure)
+    MESSAGE_QUEUE_MAX: int = 10_000       # unwritten rows before add_message is refused
+
+    # NDJSON conversation export
+    EXPORT_YIELD_PER: int = 500  # rows fetched per round trip from the server-side cursor
+
+    # Cold storage — idle conversations are moved out of the messages table
+    ARCHIVE_ENABLED: bool = True
+    ARCHIVE_IDLE_DAYS: int = 30          # no new messages for this long -> archive
+    ARCHIVE_INTERVAL: float = 3600.0     # seconds between compaction runs
+    ARCHIVE_BATCH_SIZE: int = 100        # conversations archived per run
+
     # CORS (comma-separated in env, e.g. CORS_ORIGINS=https://myapp.onrender.com,http://localhost:5173)
     CORS_ORIGINS: list[str] = ["http://localhost:3000", "http://localhost:5173"]
     CORS_ALLOW_ALL: bool = False  # Set to true in production if frontend is same-origin
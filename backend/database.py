@@ -1,11 +1,95 @@
+import time
 from collections.abc import AsyncGenerator
 
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from backend.config import settings
+from backend.migrations import acquire_migration_lock, run_migrations
 
-engine = create_async_engine(settings.db_url, echo=False)
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def recreate(self):
+        # Carry the counters over when the engine rebuilds the pool (e.g. dispose)
+        new_pool = super().recreate()
+        new_pool.checkouts = self.checkouts
+        new_pool.timeouts = self.timeouts
+        new_pool.total_wait = self.total_wait
+        new_pool.max_wait = self.max_wait
+        return new_pool
+
+
+def _postgres_connect_args() -> dict:
+    cache_size = settings.DB_PREPARED_STATEMENT_CACHE_SIZE
+    args = {"prepared_statement_cache_size": cache_size}
+    if cache_size == 0:
+        # Also disable asyncpg's own cache, or pgbouncer (transaction mode) breaks it
+        args["statement_cache_size"] = 0
+    return args
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Per-connection SQLite tuning: WAL lets readers run alongside the single
+    writer, and foreign keys are off by default in SQLite."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; safe with WAL
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _create_engine():
+    pool_args = {
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    if settings.db_url.startswith("sqlite"):
+        sqlite_engine = create_async_engine(settings.db_url, echo=False, **pool_args)
+        event.listen(sqlite_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        return sqlite_engine
+    return create_async_engine(
+        settings.db_url,
+        echo=False,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=_postgres_connect_args(),
+        **pool_args,
+    )
+
+
+engine = _create_engine()
 
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
@@ -14,16 +98,51 @@ class Base(DeclarativeBase):
     pass
 
 
+def insert(model):
+    """INSERT for the active dialect — PostgreSQL and SQLite both support
+    `.on_conflict_do_nothing()` and `.returning()` on it."""
+    if engine.dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """FastAPI dependency that yields an async DB session."""
     async with async_session() as session:
         yield session
 
 
+async def release_connection(db: AsyncSession) -> None:
+    """End the session's transaction so its connection goes back to the pool.
+    The session stays usable and checks a connection out again on next use."""
+    await db.close()
+
+
+def pool_status() -> dict:
+    """Pool utilization and checkout wait times, for /api/health."""
+    pool = engine.pool
+    capacity = pool.size() + settings.DB_MAX_OVERFLOW
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "utilization": round(checked_out / capacity, 3) if capacity else None,
+        "checkouts": pool.checkouts,
+        "timeouts": pool.timeouts,
+        "avg_wait_ms": round(pool.total_wait / pool.checkouts * 1000, 2) if pool.checkouts else 0.0,
+        "max_wait_ms": round(pool.max_wait * 1000, 2),
+    }
+
+
 async def init_db() -> None:
-    """Create all tables if they don't exist."""
+    """Create missing tables, then apply pending schema migrations."""
     async with engine.begin() as conn:
+        await acquire_migration_lock(conn)
         await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
 
 
 async def close_db() -> None:
@@ -0,0 +1,42 @@
+"""Shared outbound HTTP client — one keep-alive connection pool for the process."""
+
+import importlib.util
+import logging
+
+import httpx
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared client, created on first use.
+
+    Connections are kept alive between requests, so repeated lookups skip the
+    TCP+TLS handshake. HTTP/2 is negotiated when the optional `h2` package is
+    installed (pip install 'httpx[http2]')."""
+    global _client
+    if _client is None or _client.is_closed:
+        http2 = importlib.util.find_spec("h2") is not None
+        _client = httpx.AsyncClient(
+            http2=http2,
+            timeout=settings.HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            headers={"User-Agent": "Mozilla/5.0"},
+        )
+        logger.info(f"[HTTP] Opened shared client (http2={http2})")
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,87 @@
+"""Fast JSON (orjson) that tolerates the NaN/Infinity literals the MCP tools emit."""
+
+import math
+import re
+from typing import Any
+
+import orjson
+
+_NAN = re.compile("NaN")
+_INFINITY = re.compile("Infinity")
+_ESCAPE = re.compile(r"\\.", re.DOTALL)
+
+
+def _null_non_finite(text: str) -> str:
+    """text with every bare NaN/Infinity/-Infinity token replaced by null.
+
+    Occurrences inside string literals are left alone. Escape sequences are
+    masked with same-length filler, so the parity of the quotes before an
+    occurrence tells whether it sits inside a string. The scans are literal
+    searches; Python only loops over the occurrences themselves."""
+    masked = _ESCAPE.sub("__", text) if "\\" in text else text
+    spans = [m.span() for m in _NAN.finditer(masked)]
+    for m in _INFINITY.finditer(masked):
+        start = m.start()
+        spans.append((start - 1 if start and masked[start - 1] == "-" else start, m.end()))
+    spans.sort()
+
+    parts = []
+    quotes = scanned = copied = 0
+    for start, end in spans:
+        quotes += masked.count('"', scanned, start)
+        scanned = start
+        if quotes % 2 == 0:
+            parts.append(text[copied:start])
+            parts.append("null")
+            copied = end
+    parts.append(text[copied:])
+    return "".join(parts)
+
+
+def loads(data: str | bytes) -> Any:
+    """Parse JSON with orjson, mapping NaN/Infinity literals (invalid JSON, but
+    what Python's json.dumps writes) to None.
+
+    Payloads carrying those literals have them rewritten to null first and
+    still take the orjson path, at a fraction of the stdlib parser's cost."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        if b"NaN" not in data and b"Infinity" not in data:
+            return orjson.loads(data)
+        data = bytes(data).decode()
+    elif "NaN" not in data and "Infinity" not in data:
+        return orjson.loads(data)
+    return orjson.loads(_null_non_finite(data))
+
+
+def dumps(obj: Any) -> str:
+    """Serialize to a str. NaN/Infinity become null; non-str keys are stringified."""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _is_clean(obj: Any) -> bool:
+    """True if obj holds no non-finite floats and no non-str dict keys."""
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, float):
+            if not math.isfinite(item):
+                return False
+        elif isinstance(item, dict):
+            for key, value in item.items():
+                if not isinstance(key, str):
+                    return False
+                if isinstance(value, (dict, list, float)):
+                    stack.append(value)
+        elif isinstance(item, list):
+            stack.extend(v for v in item if isinstance(v, (dict, list, float)))
+    return True
+
+
+def sanitize(obj: Any) -> Any:
+    """JSON-safe obj: NaN/Infinity -> None, dict keys -> str.
+
+    Returns obj itself when it is already clean. Otherwise one orjson round
+    trip does the rewriting natively instead of rebuilding it in Python."""
+    if _is_clean(obj):
+        return obj
+    return orjson.loads(orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS))
@@ -11,8 +11,15 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.agent_manager import agent_manager
 from backend.config import settings
-from backend.database import close_db, get_db, init_db
-from backend.store import ensure_session
+from backend.database import close_db, get_db, init_db, pool_status
+from backend.http_client import close_http_client, get_http_client
+from backend.services.archive_service import conversation_archiver
+from backend.services.chat_service import conversation_ids, message_writer
+from backend.services.quote_stream import quote_broadcaster
+from backend.services.stock_service import search_cache
+from backend.services.symbol_index import symbol_index
+from backend.store import ensure_session, known_sessions
+from backend.tool_utils import tool_cache
 
 FRONTEND_DIR = Path(__file__).resolve().parent.parent / "frontend" / "dist"
 
@@ -25,11 +32,24 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up...")
     await init_db()
+    message_writer.start()
     await agent_manager.initialize()
+    tool_cache.start_sweeper()
+    get_http_client()  # shared keep-alive pool for outbound HTTP
+    symbol_index.load_bundled()
+    symbol_index.start_refresher()
+    conversation_archiver.start()
     logger.info("Startup complete.")
     yield
     # Shutdown — cleanly terminate MCP subprocesses and DB pool
+    await quote_broadcaster.stop()
+    await symbol_index.stop_refresher()
+    await close_http_client()
+    await conversation_archiver.stop()
+    await tool_cache.stop_sweeper()
+    await tool_cache.close()
     await agent_manager.shutdown()
+    await message_writer.stop()
     await close_db()
 
 
@@ -54,7 +74,24 @@ app.include_router(chat.router)
 
 @app.get("/api/health")
 async def health():
-    return {"status": "ok", "tools": [t.name for t in agent_manager.tools]}
+    return {
+        "status": "ok",
+        "tools": [t.name for t in agent_manager.tools],
+        "mcp_pools": agent_manager.pool_stats(),
+        "conversations": agent_manager.conversation_stats(),
+        "answer_cache": agent_manager.answer_cache_stats(),
+        "id_caches": {
+            "sessions": known_sessions.stats(),
+            "conversations": conversation_ids.stats(),
+        },
+        "tool_cache": tool_cache.stats(),
+        "db_pool": pool_status(),
+        "message_writer": message_writer.stats(),
+        "archive": conversation_archiver.stats(),
+        "quote_stream": quote_broadcaster.stats(),
+        "symbol_index": symbol_index.stats(),
+        "search_cache": search_cache.stats(),
+    }
 
 
 @app.post("/api/session")
@@ -0,0 +1,199 @@
+"""Pooled MCP sessions — N stdio subprocesses per server, least-loaded dispatch,
+health checks and automatic respawn."""
+
+import asyncio
+import contextlib
+import logging
+from typing import Any
+
+import anyio
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.sessions import create_session
+from langchain_mcp_adapters.tools import load_mcp_tools
+from mcp import ClientSession
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the session's transport (and usually its subprocess) is gone
+_DEAD_SESSION_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+
+# Minimum gap between health passes, so repeated wake-ups can't spin on respawns
+_MIN_CHECK_SPACING = 1.0
+
+
+class MCPSessionWorker:
+    """One MCP session and its subprocess, owned by a dedicated task.
+
+    create_session() is built on anyio task groups, which must be entered and
+    exited from the same task. The worker therefore runs the whole session
+    lifetime inside `_run` and is stopped by setting an event."""
+
+    def __init__(self, server_name: str, index: int, connection: dict):
+        self.name = f"{server_name}#{index}"
+        self.index = index
+        self._connection = connection
+        self.session: ClientSession | None = None
+        self.tools: dict[str, BaseTool] = {}
+        self.in_flight = 0
+        self.healthy = False
+        self._ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Spawn the subprocess and wait until its session is initialized."""
+        self._task = asyncio.create_task(self._run(), name=f"mcp-session-{self.name}")
+        ready = asyncio.create_task(self._ready.wait())
+        try:
+            await asyncio.wait(
+                {ready, self._task},
+                timeout=settings.MCP_CONNECT_TIMEOUT,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+        finally:
+            ready.cancel()
+        if not self._ready.is_set():
+            await self.stop()
+            raise RuntimeError(f"MCP session '{self.name}' failed to start")
+        self.healthy = True
+
+    async def _run(self) -> None:
+        try:
+            async with create_session(self._connection) as session:
+                await session.initialize()
+                tools = await load_mcp_tools(session)
+                self.tools = {t.name: t for t in tools}
+                self.session = session
+                self._ready.set()
+                await self._stop.wait()
+        except Exception:
+            logger.exception(f"MCP session '{self.name}' exited with an error")
+        finally:
+            self.session = None
+            self.healthy = False
+
+    async def ping(self) -> bool:
+        if self.session is None or self._task is None or self._task.done():
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=settings.MCP_HEALTH_CHECK_TIMEOUT)
+            return True
+        except Exception as e:  # noqa: BLE001 — any failure marks the session unhealthy
+            logger.warning(f"MCP session '{self.name}' failed health check — {type(e).__name__}: {e}")
+            return False
+
+    async def stop(self) -> None:
+        """Close the session and terminate its subprocess."""
+        self.healthy = False
+        self._stop.set()
+        if self._task is not None and not self._task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout=settings.MCP_CONNECT_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await self._task
+
+
+class MCPSessionPool:
+    """A fixed number of sessions for one MCP server.
+
+    Tool calls go to the healthy session with the fewest outstanding requests.
+    A background task pings every session periodically (or immediately after a
+    call fails with a dead transport) and respawns the ones that are down."""
+
+    def __init__(self, server_name: str, connection: dict, size: int):
+        self.server_name = server_name
+        self._connection = connection
+        self._workers = [MCPSessionWorker(server_name, i, connection) for i in range(max(1, size))]
+        self._health_task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self._respawns = 0
+
+    async def start(self) -> None:
+        """Start every session concurrently. Raises only if none came up."""
+        results = await asyncio.gather(*(w.start() for w in self._workers), return_exceptions=True)
+        failed = [r for r in results if isinstance(r, BaseException)]
+        if len(failed) == len(self._workers):
+            raise failed[0]
+        if failed:
+            logger.warning(
+                f"MCP server '{self.server_name}': {len(failed)}/{len(self._workers)} "
+                f"sessions failed to start, will retry in the background"
+            )
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    def tools(self) -> list[BaseTool]:
+        """LangChain tools whose calls are dispatched across the pool."""
+        template = next(w for w in self._workers if w.healthy)
+        return [
+            tool.model_copy(update={"coroutine": self._dispatcher(name)})
+            for name, tool in template.tools.items()
+        ]
+
+    def _dispatcher(self, tool_name: str):
+        async def dispatch(**kwargs: Any):
+            return await self._call(tool_name, kwargs)
+        return dispatch
+
+    def _pick(self) -> MCPSessionWorker:
+        healthy = [w for w in self._workers if w.healthy]
+        if not healthy:
+            self._wakeup.set()
+            raise RuntimeError(f"No healthy MCP sessions for server '{self.server_name}'")
+        return min(healthy, key=lambda w: w.in_flight)
+
+    async def _call(self, tool_name: str, arguments: dict) -> Any:
+        worker = self._pick()
+        worker.in_flight += 1
+        try:
+            return await worker.tools[tool_name].coroutine(**arguments)
+        except _DEAD_SESSION_ERRORS:
+            logger.warning(f"MCP session '{worker.name}' transport closed, scheduling respawn")
+            worker.healthy = False
+            self._wakeup.set()
+            raise
+        finally:
+            worker.in_flight -= 1
+
+    async def _health_loop(self) -> None:
+        while True:
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.MCP_HEALTH_CHECK_INTERVAL)
+            self._wakeup.clear()
+            for worker in list(self._workers):
+                if worker.healthy and await worker.ping():
+                    continue
+                await self._respawn(worker)
+            await asyncio.sleep(_MIN_CHECK_SPACING)
+
+    async def _respawn(self, worker: MCPSessionWorker) -> None:
+        logger.info(f"Respawning MCP session '{worker.name}'")
+        await worker.stop()
+        replacement = MCPSessionWorker(self.server_name, worker.index, self._connection)
+        try:
+            await replacement.start()
+        except Exception:
+            logger.exception(f"Failed to respawn MCP session '{worker.name}'")
+            return
+        self._workers[worker.index] = replacement
+        self._respawns += 1
+        logger.info(f"MCP session '{replacement.name}' respawned")
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._health_task
+            self._health_task = None
+        await asyncio.gather(*(w.stop() for w in self._workers), return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._workers),
+            "healthy": sum(w.healthy for w in self._workers),
+            "in_flight": [w.in_flight for w in self._workers],
+            "respawns": self._respawns,
+        }
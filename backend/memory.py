@@ -0,0 +1,170 @@
+"""Per-conversation agent memory — full buffer, or a recent window plus a rolling summary."""
+
+import logging
+from datetime import datetime
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# (created_at, id) of a stored message — its place in the conversation
+Position = tuple[datetime, str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 chars per token) — no tokenizer dependency."""
+    return len(text) // 4 + 4
+
+
+class ConversationMemory:
+    """Chat history for one conversation.
+
+    In "buffer" mode every turn is kept verbatim. In "summary" mode only the
+    last AGENT_MEMORY_WINDOW_TURNS turns are kept verbatim, and the window plus
+    summary is capped at AGENT_MEMORY_MAX_TOKENS. Older turns are folded into a
+    running summary by the LLM, so prompt size stays flat however long the
+    conversation gets.
+
+    `folded_through` is the position of the last stored message folded into
+    the summary; it is persisted with the summary so a cold start only
+    reloads the turns after it."""
+
+    def __init__(self, llm: BaseChatModel, mode: str | None = None):
+        self._llm = llm
+        self.mode = mode or settings.AGENT_MEMORY_MODE
+        self.summary = ""
+        self.folded_through: Position | None = None
+        self._messages: list[BaseMessage] = []
+        self._positions: list[Position | None] = []  # parallel to _messages
+        # Restored turns that didn't fit the budget: out of the prompt, but not
+        # yet in the summary — the next compact() folds them in
+        self._backlog: list[tuple[BaseMessage, Position | None]] = []
+        self._compacting = False
+
+    @classmethod
+    def history_limit(cls) -> int | None:
+        """How many stored messages a cold start needs. None means all of them."""
+        if settings.AGENT_MEMORY_MODE == "summary":
+            return settings.AGENT_MEMORY_WINDOW_TURNS * 2
+        return None
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        """History to pass as the prompt's chat_history."""
+        if self.summary:
+            return [
+                SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}"),
+                *self._messages,
+            ]
+        return list(self._messages)
+
+    def add_message(self, role: str, content: str, position: Position | None = None) -> None:
+        if role == "user":
+            self._messages.append(HumanMessage(content=content))
+        elif role == "assistant":
+            self._messages.append(AIMessage(content=content))
+        else:
+            return
+        self._positions.append(position)
+
+    def add_turn(
+        self,
+        user_message: str,
+        ai_message: str,
+        user_position: Position | None = None,
+        ai_position: Position | None = None,
+    ) -> None:
+        self.add_message("user", user_message, user_position)
+        self.add_message("assistant", ai_message, ai_position)
+
+    def restore(self, summary: str, folded_through: Position | None, history: list[dict]) -> None:
+        """Rebuild from storage: the persisted summary and the messages stored
+        after `folded_through` ({role, content, created_at, id} dicts, oldest
+        first). In summary mode the oldest of them are moved out of the prompt
+        until it fits the window and token budget, so the first prompt after a
+        cold start is no bigger than a warm one."""
+        self.summary = summary
+        self.folded_through = folded_through
+        for msg in history:
+            self.add_message(msg["role"], msg["content"], (msg["created_at"], msg["id"]))
+        if self.mode != "summary":
+            return
+        overflow = len(self._overflow())
+        self._backlog = list(zip(self._messages[:overflow], self._positions[:overflow]))
+        del self._messages[:overflow]
+        del self._positions[:overflow]
+
+    def _overflow(self) -> list[BaseMessage]:
+        """The oldest messages that no longer fit the window or token budget."""
+        max_messages = settings.AGENT_MEMORY_WINDOW_TURNS * 2
+        budget = settings.AGENT_MEMORY_MAX_TOKENS - estimate_tokens(self.summary)
+        messages = self._messages
+        start = 0
+        # Always keep the latest turn verbatim, even if it alone is over budget
+        while len(messages) - start > 2 and (
+            len(messages) - start > max_messages
+            or sum(estimate_tokens(m.content) for m in messages[start:]) > budget
+        ):
+            start += 1
+            # Never start the window on an assistant reply
+            while start < len(messages) and isinstance(messages[start], AIMessage):
+                start += 1
+        return messages[:start]
+
+    async def compact(self) -> bool:
+        """In summary mode, fold turns that fell out of the window (and any
+        restored backlog) into the summary. Returns True if anything was folded,
+        i.e. the summary or `folded_through` changed and should be persisted.
+
+        Meant to run in the background: the window is only trimmed once the new
+        summary is in, so a prompt built meanwhile still sees the turns being
+        folded. Overlapping calls are no-ops."""
+        if self.mode != "summary" or self._compacting:
+            return False
+        backlog = list(self._backlog)
+        overflow = self._overflow()
+        if not backlog and not overflow:
+            return False
+
+        self._compacting = True
+        try:
+            summary = await self._summarize([m for m, _ in backlog] + overflow)
+        finally:
+            self._compacting = False
+        # Turns are only ever appended, so the folded ones are still the oldest
+        positions = [p for _, p in backlog] + self._positions[:len(overflow)]
+        del self._backlog[:len(backlog)]
+        del self._messages[:len(overflow)]
+        del self._positions[:len(overflow)]
+        self.summary = summary
+        last = next((p for p in reversed(positions) if p is not None), None)
+        if last is not None:
+            self.folded_through = last
+        return True
+
+    async def _summarize(self, messages: list[BaseMessage]) -> str:
+        transcript = "\n".join(
+            f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}"
+            for m in messages
+        )
+        prompt = settings.MEMORY_SUMMARY_PROMPT.format(
+            max_words=settings.AGENT_MEMORY_MAX_TOKENS // 8,
+        )
+        try:
+            response = await self._llm.ainvoke([
+                SystemMessage(content=prompt),
+                HumanMessage(
+                    content=f"Current summary:\n{self.summary or '(none)'}\n\nNew lines:\n{transcript}"
+                ),
+            ])
+            return str(response.content).strip()
+        except Exception as e:  # noqa: BLE001
+            # Losing detail from old turns beats failing the conversation
+            logger.warning(
+                f"[MEMORY] Summary update failed, dropping {len(messages)} old messages — "
+                f"{type(e).__name__}: {e}"
+            )
+            return self.summary
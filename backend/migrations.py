@@ -0,0 +1,148 @@
+"""Versioned schema migrations — applied once each, in order, at startup.
+
+`create_all` only creates missing tables; it never alters existing ones. Any
+change to an existing table (indexes, constraints, columns) goes here as a new
+Migration with the next version number. Statements must be safe on a fresh
+database too, where `create_all` has already built the latest schema — new
+columns go in as AddColumn, which is skipped when the column exists.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for pg_advisory_xact_lock — serializes workers starting together
+_MIGRATION_LOCK_ID = 7_351_902
+
+
+@dataclass(frozen=True)
+class AddColumn:
+    """ALTER TABLE ... ADD COLUMN, skipped when the column already exists
+    (a fresh database, where create_all built the latest schema)."""
+
+    table: str
+    column: str
+    ddl: str  # type and constraints, e.g. "VARCHAR"
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: tuple[str | AddColumn, ...]
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        version=1,
+        name="unique_and_hot_path_indexes",
+        statements=(
+            # Drop duplicate watchlist rows, keeping one per (session_id, symbol)
+            (
+                "DELETE FROM watchlist_items WHERE id NOT IN ("
+                "SELECT MIN(id) FROM watchlist_items GROUP BY session_id, symbol)"
+            ),
+            # Move messages of duplicate conversations onto the surviving one...
+            (
+                "UPDATE messages SET conversation_id = ("
+                "SELECT MIN(c2.id) FROM conversations c1 JOIN conversations c2 "
+                "ON c2.session_id = c1.session_id AND c2.symbol = c1.symbol "
+                "WHERE c1.id = messages.conversation_id) "
+                "WHERE conversation_id NOT IN ("
+                "SELECT MIN(id) FROM conversations GROUP BY session_id, symbol)"
+            ),
+            # ...then drop the duplicates
+            (
+                "DELETE FROM conversations WHERE id NOT IN ("
+                "SELECT MIN(id) FROM conversations GROUP BY session_id, symbol)"
+            ),
+            (
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_watchlist_items_session_symbol "
+                "ON watchlist_items (session_id, symbol)"
+            ),
+            (
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_conversations_session_symbol "
+                "ON conversations (session_id, symbol)"
+            ),
+            (
+                "CREATE INDEX IF NOT EXISTS ix_messages_conversation_created_at "
+                "ON messages (conversation_id, created_at)"
+            ),
+        ),
+    ),
+    Migration(
+        version=2,
+        name="message_keyset_index",
+        statements=(
+            (
+                "CREATE INDEX IF NOT EXISTS ix_messages_conversation_created_at_id "
+                "ON messages (conversation_id, created_at, id)"
+            ),
+            "DROP INDEX IF EXISTS ix_messages_conversation_created_at",
+        ),
+    ),
+    Migration(
+        version=3,
+        name="memory_summary_watermark",
+        statements=(
+            AddColumn("conversation_summaries", "folded_through_at", "TIMESTAMP WITH TIME ZONE"),
+            AddColumn("conversation_summaries", "folded_through_id", "VARCHAR"),
+        ),
+    ),
+    Migration(
+        version=4,
+        name="conversation_archived_count",
+        statements=(
+            AddColumn("conversations", "archived_count", "INTEGER NOT NULL DEFAULT 0"),
+            (
+                "UPDATE conversations SET archived_count = ("
+                "SELECT message_count FROM conversation_archives a WHERE a.conversation_id = conversations.id) "
+                "WHERE id IN (SELECT conversation_id FROM conversation_archives)"
+            ),
+        ),
+    ),
+]
+
+
+async def acquire_migration_lock(conn: AsyncConnection) -> None:
+    """Hold a transaction-scoped lock so only one worker creates/migrates at a time."""
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _MIGRATION_LOCK_ID})
+
+
+async def run_migrations(conn: AsyncConnection) -> None:
+    """Apply every migration newer than the recorded schema version."""
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR NOT NULL, "
+        "applied_at TIMESTAMP WITH TIME ZONE NOT NULL)"
+    ))
+    result = await conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations"))
+    current = result.scalar_one()
+
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        logger.info(f"Applying schema migration {migration.version}: {migration.name}")
+        for statement in migration.statements:
+            if isinstance(statement, AddColumn):
+                await _add_column(conn, statement)
+            else:
+                await conn.execute(text(statement))
+        await conn.execute(
+            text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+            {"v": migration.version, "n": migration.name, "t": datetime.now(timezone.utc)},
+        )
+
+
+async def _add_column(conn: AsyncConnection, change: AddColumn) -> None:
+    columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns(change.table))
+    if any(column["name"] == change.column for column in columns):
+        return
+    await conn.execute(text(f"ALTER TABLE {change.table} ADD COLUMN {change.column} {change.ddl}"))
@@ -1,7 +1,16 @@
 import uuid
 from datetime import datetime, timezone
 
-from sqlalchemy import DateTime, ForeignKey, String, Text
+from sqlalchemy import (
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    TypeDecorator,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from backend.database import Base
@@ -15,11 +24,29 @@ def _new_id() -> str:
     return str(uuid.uuid4())
 
 
+class UTCDateTime(TypeDecorator):
+    """Timezone-aware UTC datetimes on every backend. SQLite has no timezone
+    type and returns naive values, so they are normalized here."""
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+
 class Session(Base):
     __tablename__ = "sessions"
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=_new_id)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_utcnow)
+    created_at: Mapped[datetime] = mapped_column(UTCDateTime, default=_utcnow)
 
     watchlist_items: Mapped[list["WatchlistItem"]] = relationship(
         back_populates="session", cascade="all, delete-orphan"
@@ -31,37 +58,90 @@ class Session(Base):
 
 class WatchlistItem(Base):
     __tablename__ = "watchlist_items"
+    __table_args__ = (
+        Index("uq_watchlist_items_session_symbol", "session_id", "symbol", unique=True),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=_new_id)
     session_id: Mapped[str] = mapped_column(ForeignKey("sessions.id", ondelete="CASCADE"))
     symbol: Mapped[str] = mapped_column(String, nullable=False)
     stock_name: Mapped[str] = mapped_column(String, nullable=False)
-    added_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_utcnow)
+    added_at: Mapped[datetime] = mapped_column(UTCDateTime, default=_utcnow)
 
     session: Mapped["Session"] = relationship(back_populates="watchlist_items")
 
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        Index("uq_conversations_session_symbol", "session_id", "symbol", unique=True),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=_new_id)
     session_id: Mapped[str] = mapped_column(ForeignKey("sessions.id", ondelete="CASCADE"))
     symbol: Mapped[str] = mapped_column(String, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_utcnow)
+    created_at: Mapped[datetime] = mapped_column(UTCDateTime, default=_utcnow)
+    # Messages in the archive blob — kept by the archiver so reads only touch
+    # conversation_archives when there is something in it
+    archived_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
 
     session: Mapped["Session"] = relationship(back_populates="conversations")
     messages: Mapped[list["Message"]] = relationship(
         back_populates="conversation", cascade="all, delete-orphan", order_by="Message.created_at"
     )
+    archive: Mapped["ConversationArchive | None"] = relationship(
+        back_populates="conversation", cascade="all, delete-orphan"
+    )
+    memory_summary: Mapped["ConversationSummary | None"] = relationship(
+        back_populates="conversation", cascade="all, delete-orphan"
+    )
 
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Keyset pagination orders by (created_at, id) within a conversation
+        Index("ix_messages_conversation_created_at_id", "conversation_id", "created_at", "id"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True, default=_new_id)
     conversation_id: Mapped[str] = mapped_column(ForeignKey("conversations.id", ondelete="CASCADE"))
     role: Mapped[str] = mapped_column(String, nullable=False)  # user / assistant / error
     content: Mapped[str] = mapped_column(Text, nullable=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_utcnow)
+    created_at: Mapped[datetime] = mapped_column(UTCDateTime, default=_utcnow)
 
     conversation: Mapped["Conversation"] = relationship(back_populates="messages")
+
+
+class ConversationArchive(Base):
+    """Cold storage: the messages of an idle conversation as one gzip'd JSON blob."""
+
+    __tablename__ = "conversation_archives"
+
+    conversation_id: Mapped[str] = mapped_column(
+        ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True
+    )
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(UTCDateTime, default=_utcnow)
+
+    conversation: Mapped["Conversation"] = relationship(back_populates="archive")
+
+
+class ConversationSummary(Base):
+    """Rolling summary of the turns that fell out of the agent's memory window,
+    so a cold start (eviction, restart, another worker) keeps older context."""
+
+    __tablename__ = "conversation_summaries"
+
+    conversation_id: Mapped[str] = mapped_column(
+        ForeignKey("conversations.id", ondelete="CASCADE"), primary_key=True
+    )
+    summary: Mapped[str] = mapped_column(Text, nullable=False)
+    # (created_at, id) of the last message folded into the summary — a cold
+    # start only reloads the messages after it
+    folded_through_at: Mapped[datetime | None] = mapped_column(UTCDateTime, nullable=True)
+    folded_through_id: Mapped[str | None] = mapped_column(String, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(UTCDateTime, default=_utcnow)
+
+    conversation: Mapped["Conversation"] = relationship(back_populates="memory_summary")
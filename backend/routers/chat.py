@@ -1,80 +1,91 @@
-import json
 import logging
+import re
 
 from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend import json_utils
 from backend.agent_manager import agent_manager
-from backend.database import get_db, async_session
+from backend.compression import CompressedRoute
+from backend.database import async_session, get_db, release_connection
 from backend.dependencies import get_session_id
 from backend.schemas import MessageHistoryResponse, MessageResponse
 from backend.services.chat_service import (
+    InvalidCursorError,
     delete_conversation,
+    export_messages,
+    get_conversation_id,
     get_messages,
 )
 from backend.store import ensure_session
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/chat", tags=["chat"])
+# Message history pages are compressed; NDJSON exports stream uncompressed
+router = APIRouter(prefix="/api/chat", tags=["chat"], route_class=CompressedRoute)
 
 
 # ── WebSocket streaming chat ─────────────────────────────────────────────────
 
 @router.websocket("/{symbol}/ws")
 async def websocket_chat(websocket: WebSocket, symbol: str, session_id: str = Query(...)):
-    # WebSocket endpoints can't use Depends for DB sessions,
-    # so we create one manually.
+    # WebSocket endpoints can't use Depends for DB sessions, so the connection
+    # gets one session for its lifetime. A session only holds a pool connection
+    # inside a transaction, and it is released before every LLM stream and
+    # after every message, so idle sockets hold no connections.
     async with async_session() as db:
         session_id = await ensure_session(db, session_id)
+        await release_connection(db)
 
-    await websocket.accept()
+        await websocket.accept()
 
-    try:
-        while True:
-            raw = await websocket.receive_text()
-            data = json.loads(raw)
-
-            if data.get("type") != "message" or not data.get("content", "").strip():
-                continue
-
-            user_message = data["content"].strip()
-
-            # Each message gets its own DB session
-            async with async_session() as db:
-                async for event in agent_manager.chat_stream(
-                    db=db,
-                    session_id=session_id,
-                    symbol=symbol,
-                    user_message=user_message,
-                ):
-                    if event["type"] == "token":
-                        await websocket.send_text(json.dumps({"type": "token", "content": event["content"]}))
-
-                    elif event["type"] == "tool_start":
-                        await websocket.send_text(json.dumps({"type": "tool_start", "tool_name": event["tool_name"]}))
-
-                    elif event["type"] == "tool_end":
-                        await websocket.send_text(json.dumps({"type": "tool_end", "tool_name": event["tool_name"]}))
-
-                    elif event["type"] == "done":
-                        # If guardrail appended a disclaimer, send it as a final token
-                        disclaimer = event.get("disclaimer", "")
-                        if disclaimer:
-                            await websocket.send_text(json.dumps({"type": "token", "content": disclaimer}))
-                        await websocket.send_text(json.dumps({"type": "done"}))
-
-                    elif event["type"] == "error":
-                        await websocket.send_text(json.dumps({"type": "error", "content": event["content"]}))
-
-    except WebSocketDisconnect:
-        logger.info(f"WebSocket disconnected: session={session_id}, symbol={symbol}")
-    except Exception:
-        logger.exception("WebSocket error")
         try:
-            await websocket.close(code=1011, reason="Internal error")
+            while True:
+                raw = await websocket.receive_text()
+                data = json_utils.loads(raw)
+
+                if data.get("type") != "message" or not data.get("content", "").strip():
+                    continue
+
+                user_message = data["content"].strip()
+
+                try:
+                    async for event in agent_manager.chat_stream(
+                        db=db,
+                        session_id=session_id,
+                        symbol=symbol,
+                        user_message=user_message,
+                    ):
+                        if event["type"] == "token":
+                            await websocket.send_text(json_utils.dumps({"type": "token", "content": event["content"]}))
+
+                        elif event["type"] == "tool_start":
+                            await websocket.send_text(json_utils.dumps({"type": "tool_start", "tool_name": event["tool_name"]}))
+
+                        elif event["type"] == "tool_end":
+                            await websocket.send_text(json_utils.dumps({"type": "tool_end", "tool_name": event["tool_name"]}))
+
+                        elif event["type"] == "done":
+                            # If guardrail appended a disclaimer, send it as a final token
+                            disclaimer = event.get("disclaimer", "")
+                            if disclaimer:
+                                await websocket.send_text(json_utils.dumps({"type": "token", "content": disclaimer}))
+                            await websocket.send_text(json_utils.dumps({"type": "done"}))
+
+                        elif event["type"] == "error":
+                            await websocket.send_text(json_utils.dumps({"type": "error", "content": event["content"]}))
+                finally:
+                    await release_connection(db)
+
+        except WebSocketDisconnect:
+            logger.info(f"WebSocket disconnected: session={session_id}, symbol={symbol}")
         except Exception:
-            pass
+            logger.exception("WebSocket error")
+            try:
+                await websocket.close(code=1011, reason="Internal error")
+            except Exception:
+                pass
 
 
 # ── REST: Message history ────────────────────────────────────────────────────
@@ -83,17 +94,49 @@ async def websocket_chat(websocket: WebSocket, symbol: str, session_id: str = Qu
 async def get_message_history(
     symbol: str,
     limit: int = Query(50, ge=1, le=100),
-    before: str | None = Query(None),
+    cursor: str | None = Query(None, description="next_cursor from the previous page"),
     session_id: str = Depends(get_session_id),
     db: AsyncSession = Depends(get_db),
 ):
-    messages, has_more = await get_messages(db, session_id, symbol, limit, before)
+    try:
+        messages, next_cursor = await get_messages(db, session_id, symbol, limit, cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
     return MessageHistoryResponse(
         messages=[MessageResponse(**m) for m in messages],
-        has_more=has_more,
+        has_more=next_cursor is not None,
+        next_cursor=next_cursor,
+    )
+
+
+# ── REST: NDJSON export ──────────────────────────────────────────────────────
+
+def _ndjson_response(lines, filename: str) -> StreamingResponse:
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
 
 
+@router.get("/export")
+async def export_all_conversations(session_id: str = Depends(get_session_id)):
+    """Every conversation of the session, one JSON message per line."""
+    return _ndjson_response(export_messages(session_id), "conversations.ndjson")
+
+
+@router.get("/{symbol}/export")
+async def export_conversation(symbol: str, session_id: str = Depends(get_session_id)):
+    """One conversation, one JSON message per line."""
+    # Short-lived session for the existence check; export_messages opens its own
+    async with async_session() as db:
+        conv_id = await get_conversation_id(db, session_id, symbol)
+    if conv_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No conversation found")
+    safe_symbol = re.sub(r"[^A-Za-z0-9._-]", "_", symbol)
+    return _ndjson_response(export_messages(session_id, symbol), f"{safe_symbol}-conversation.ndjson")
+
+
 # ── REST: Delete conversation ────────────────────────────────────────────────
 
 @router.delete("/{symbol}", status_code=status.HTTP_204_NO_CONTENT)
@@ -105,4 +148,4 @@ async def clear_chat(
     deleted = await delete_conversation(db, session_id, symbol)
     if not deleted:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No conversation found")
-    agent_manager.remove_executor(session_id, symbol)
+    agent_manager.remove_conversation(session_id, symbol)
@@ -1,19 +1,144 @@
-from fastapi import APIRouter, Depends, Query
+import asyncio
+import contextlib
+import logging
 
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import ORJSONResponse
+
+from backend import json_utils
+from backend.compression import CompressedRoute
+from backend.config import settings
+from backend.database import async_session
 from backend.dependencies import get_session_id
 from backend.services import stock_service
+from backend.services.quote_stream import quote_broadcaster
+from backend.store import ensure_session
+
+logger = logging.getLogger(__name__)
+
+# Stock payloads are plain JSON from the MCP tools. The handlers return
+# ORJSONResponse themselves, which skips FastAPI's jsonable_encoder walk and
+# serializes straight to bytes (NaN/Infinity -> null). Bodies are compressed.
+router = APIRouter(
+    prefix="/api/stocks",
+    tags=["stocks"],
+    default_response_class=ORJSONResponse,
+    route_class=CompressedRoute,
+)
+
+
+@router.get("/quotes")
+async def quotes(
+    symbols: str = Query(..., description="Comma-separated symbols, e.g. TCS.NS,INFY.NS"),
+    _: str = Depends(get_session_id),
+):
+    """Quotes for several symbols in one request: {"quotes": {...}, "errors": {...}}."""
+    # dict.fromkeys drops duplicates, keeping request order
+    symbol_list = list(dict.fromkeys(s.strip() for s in symbols.split(",") if s.strip()))
+    if not symbol_list:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No symbols given")
+    if len(symbol_list) > settings.QUOTES_MAX_SYMBOLS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.QUOTES_MAX_SYMBOLS} symbols per request",
+        )
+    return ORJSONResponse(await stock_service.get_stock_quotes(symbol_list))
+
+
+# ── WebSocket quote stream ───────────────────────────────────────────────────
+
+@router.websocket("/stream")
+async def quote_stream(websocket: WebSocket, session_id: str = Query(...)):
+    """Push quotes for subscribed symbols.
+
+    Client sends {"type": "subscribe" | "unsubscribe", "symbols": [...]}; the
+    server sends {"type": "quote", "symbol", "quote"} whenever a quote changes,
+    {"type": "error", "symbol", "content"} when polling a symbol fails, and
+    {"type": "error", "content"} for a rejected or malformed request."""
+    async with async_session() as db:
+        session_id = await ensure_session(db, session_id)
 
-router = APIRouter(prefix="/api/stocks", tags=["stocks"])
+    await websocket.accept()
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.QUOTE_STREAM_QUEUE_SIZE)
+    subscribed: set[str] = set()
+
+    async def send_updates() -> None:
+        while True:
+            await websocket.send_text(json_utils.dumps(await queue.get()))
+
+    async def send_error(content: str) -> None:
+        await websocket.send_text(json_utils.dumps({"type": "error", "content": content}))
+
+    sender = asyncio.create_task(send_updates())
+    try:
+        while True:
+            try:
+                data = json_utils.loads(await websocket.receive_text())
+            except ValueError:
+                await send_error("Invalid JSON")
+                continue
+            if (
+                not isinstance(data, dict)
+                or data.get("type") not in ("subscribe", "unsubscribe")
+                or not isinstance(data.get("symbols", []), list)
+            ):
+                await send_error('Expected {"type": "subscribe" | "unsubscribe", "symbols": [...]}')
+                continue
+            symbols = [s.strip() for s in data.get("symbols", []) if isinstance(s, str) and s.strip()]
+
+            if data.get("type") == "subscribe":
+                new = [s for s in dict.fromkeys(symbols) if s not in subscribed]
+                if len(subscribed) + len(new) > settings.QUOTE_STREAM_MAX_SYMBOLS:
+                    await send_error(f"At most {settings.QUOTE_STREAM_MAX_SYMBOLS} symbols per connection")
+                    continue
+                for symbol in new:
+                    subscribed.add(symbol)
+                    quote_broadcaster.subscribe(symbol, queue)
+
+            else:
+                for symbol in symbols:
+                    if symbol in subscribed:
+                        subscribed.discard(symbol)
+                        quote_broadcaster.unsubscribe(symbol, queue)
+
+    except WebSocketDisconnect:
+        logger.info(f"Quote stream disconnected: session={session_id}")
+    except Exception:
+        logger.exception("Quote stream error")
+        with contextlib.suppress(Exception):
+            await websocket.close(code=1011, reason="Internal error")
+    finally:
+        for symbol in subscribed:
+            quote_broadcaster.unsubscribe(symbol, queue)
+        sender.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await sender
 
 
 @router.get("/{symbol}/quote")
 async def quote(symbol: str, _: str = Depends(get_session_id)):
-    return await stock_service.get_stock_quote(symbol)
+    return ORJSONResponse(await stock_service.get_stock_quote(symbol))
 
 
 @router.get("/{symbol}/fundamentals")
-async def fundamentals(symbol: str, _: str = Depends(get_session_id)):
-    return await stock_service.get_stock_fundamentals(symbol)
+async def fundamentals(
+    symbol: str,
+    fields: str | None = Query(
+        None, description="Comma-separated dotted paths to return, e.g. info.trailingPE,info.marketCap"
+    ),
+    _: str = Depends(get_session_id),
+):
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    return ORJSONResponse(await stock_service.get_stock_fundamentals(symbol, field_list))
 
 
 @router.get("/{symbol}/news")
@@ -23,4 +148,4 @@ async def news(
     limit: int = Query(10, ge=1, le=50),
     _: str = Depends(get_session_id),
 ):
-    return await stock_service.get_stock_news(symbol, stock_name, limit)
+    return ORJSONResponse(await stock_service.get_stock_news(symbol, stock_name, limit))
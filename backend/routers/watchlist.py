@@ -1,36 +1,69 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.database import get_db
+from backend.database import get_db, insert, release_connection
 from backend.dependencies import get_session_id
 from backend.models import WatchlistItem
-from backend.schemas import StockSearchResult, WatchlistAddRequest, WatchlistItemResponse
-from backend.services.stock_service import search_stocks
+from backend.schemas import (
+    StockSearchResult,
+    WatchlistAddRequest,
+    WatchlistBulkAddRequest,
+    WatchlistBulkRemoveRequest,
+    WatchlistItemResponse,
+    WatchlistItemWithQuoteResponse,
+)
+from backend.services.stock_service import fetch_quotes, search_stocks
 
 router = APIRouter(prefix="/api/watchlist", tags=["watchlist"])
 
 
-@router.get("/", response_model=list[WatchlistItemResponse])
-async def list_watchlist(
-    session_id: str = Depends(get_session_id),
-    db: AsyncSession = Depends(get_db),
-):
+def _to_response(item: WatchlistItem) -> WatchlistItemResponse:
+    return WatchlistItemResponse(
+        id=item.id,
+        symbol=item.symbol,
+        stock_name=item.stock_name,
+        added_at=item.added_at.isoformat(),
+    )
+
+
+async def _list_items(db: AsyncSession, session_id: str) -> list[WatchlistItemResponse]:
     result = await db.execute(
         select(WatchlistItem)
         .where(WatchlistItem.session_id == session_id)
         .order_by(WatchlistItem.added_at)
     )
-    items = result.scalars().all()
-    return [
-        WatchlistItemResponse(
-            id=item.id,
-            symbol=item.symbol,
-            stock_name=item.stock_name,
-            added_at=item.added_at.isoformat(),
-        )
-        for item in items
-    ]
+    return [_to_response(item) for item in result.scalars().all()]
+
+
+@router.get(
+    "/",
+    response_model=list[WatchlistItemWithQuoteResponse],
+    response_model_exclude_unset=True,
+)
+async def list_watchlist(
+    include: str | None = Query(None, description='"quote" to attach each stock\'s latest quote'),
+    session_id: str = Depends(get_session_id),
+    db: AsyncSession = Depends(get_db),
+):
+    items = await _list_items(db, session_id)
+    if include != "quote" or not items:
+        return items
+
+    # Don't hold the DB connection while quotes are fetched
+    await release_connection(db)
+    results = await fetch_quotes([item.symbol for item in items])
+    response = []
+    for item in items:
+        result = results[item.symbol]
+        response.append(WatchlistItemWithQuoteResponse(
+            **item.model_dump(),
+            quote=result.quote,
+            quote_age=round(result.age, 1) if result.age is not None else None,
+            quote_fresh=result.fresh,
+            quote_error=result.error,
+        ))
+    return response
 
 
 @router.post("/", response_model=WatchlistItemResponse, status_code=status.HTTP_201_CREATED)
@@ -39,26 +72,60 @@ async def add_to_watchlist(
     session_id: str = Depends(get_session_id),
     db: AsyncSession = Depends(get_db),
 ):
-    # Check for duplicate
-    exists = await db.execute(
-        select(WatchlistItem).where(
-            WatchlistItem.session_id == session_id,
-            WatchlistItem.symbol == req.symbol,
-        )
+    # Single-statement upsert — the unique index rejects duplicates, even concurrent ones
+    result = await db.execute(
+        insert(WatchlistItem)
+        .values(session_id=session_id, symbol=req.symbol, stock_name=req.stock_name)
+        .on_conflict_do_nothing(index_elements=["session_id", "symbol"])
+        .returning(WatchlistItem)
     )
-    if exists.scalar_one_or_none():
+    item = result.scalar_one_or_none()
+    if item is None:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Stock already in watchlist")
+    await db.commit()
+    return _to_response(item)
+
 
-    item = WatchlistItem(session_id=session_id, symbol=req.symbol, stock_name=req.stock_name)
-    db.add(item)
+@router.post("/bulk", response_model=list[WatchlistItemResponse])
+async def bulk_add_to_watchlist(
+    req: WatchlistBulkAddRequest,
+    session_id: str = Depends(get_session_id),
+    db: AsyncSession = Depends(get_db),  # noqa: B008 — FastAPI dependency
+):
+    """Add many stocks in one statement; ones already present are skipped.
+    Returns the resulting watchlist."""
+    # Last occurrence wins for a symbol repeated in the request
+    names = {item.symbol: item.stock_name for item in req.items}
+    await db.execute(
+        insert(WatchlistItem)
+        .values([
+            {"session_id": session_id, "symbol": symbol, "stock_name": stock_name}
+            for symbol, stock_name in names.items()
+        ])
+        .on_conflict_do_nothing(index_elements=["session_id", "symbol"])
+    )
+    items = await _list_items(db, session_id)
     await db.commit()
-    await db.refresh(item)
-    return WatchlistItemResponse(
-        id=item.id,
-        symbol=item.symbol,
-        stock_name=item.stock_name,
-        added_at=item.added_at.isoformat(),
+    return items
+
+
+@router.post("/bulk/remove", response_model=list[WatchlistItemResponse])
+async def bulk_remove_from_watchlist(
+    req: WatchlistBulkRemoveRequest,
+    session_id: str = Depends(get_session_id),
+    db: AsyncSession = Depends(get_db),  # noqa: B008 — FastAPI dependency
+):
+    """Remove many stocks in one statement; symbols not in the watchlist are ignored.
+    Returns the resulting watchlist."""
+    await db.execute(
+        delete(WatchlistItem).where(
+            WatchlistItem.session_id == session_id,
+            WatchlistItem.symbol.in_(req.symbols),
+        )
     )
+    items = await _list_items(db, session_id)
+    await db.commit()
+    return items
 
 
 @router.delete("/{symbol}", status_code=status.HTTP_204_NO_CONTENT)
@@ -68,15 +135,13 @@ async def remove_from_watchlist(
     db: AsyncSession = Depends(get_db),
 ):
     result = await db.execute(
-        select(WatchlistItem).where(
+        delete(WatchlistItem).where(
             WatchlistItem.session_id == session_id,
             WatchlistItem.symbol == symbol,
         )
     )
-    item = result.scalar_one_or_none()
-    if item is None:
+    if result.rowcount == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Stock not in watchlist")
-    await db.delete(item)
     await db.commit()
 
 
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 # ── Watchlist ─────────────────────────────────────────────────────────────────
@@ -8,6 +8,14 @@ class WatchlistAddRequest(BaseModel):
     stock_name: str
 
 
+class WatchlistBulkAddRequest(BaseModel):
+    items: list[WatchlistAddRequest] = Field(min_length=1, max_length=500)
+
+
+class WatchlistBulkRemoveRequest(BaseModel):
+    symbols: list[str] = Field(min_length=1, max_length=500)
+
+
 class WatchlistItemResponse(BaseModel):
     id: str
     symbol: str
@@ -15,6 +23,14 @@ class WatchlistItemResponse(BaseModel):
     added_at: str
 
 
+class WatchlistItemWithQuoteResponse(WatchlistItemResponse):
+    """Watchlist row plus its latest quote (only with ?include=quote)."""
+    quote: dict | None = None
+    quote_age: float | None = None  # seconds since the quote was fetched
+    quote_fresh: bool | None = None  # within the quote cache TTL
+    quote_error: str | None = None
+
+
 class StockSearchResult(BaseModel):
     symbol: str
     name: str
@@ -34,3 +50,4 @@ class MessageResponse(BaseModel):
 class MessageHistoryResponse(BaseModel):
     messages: list[MessageResponse]
     has_more: bool
+    next_cursor: str | None = None  # pass as `cursor` to fetch the next (older) page
@@ -0,0 +1,244 @@
+"""Cold storage for idle conversations — messages compacted into one gzip'd blob each."""
+
+import asyncio
+import contextlib
+import gzip
+import json
+import logging
+import zlib
+from collections import deque
+from collections.abc import AsyncIterator, Container, Iterator
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.config import settings
+from backend.database import async_session
+from backend.models import Conversation, ConversationArchive, Message
+
+logger = logging.getLogger(__name__)
+
+# Bound on bind parameters per DELETE ... WHERE id IN (...)
+_DELETE_CHUNK = 1000
+
+# Compressed bytes fed to the decompressor per step when reading a blob
+_UNPACK_CHUNK = 16 * 1024
+
+
+# ── Blob format ──────────────────────────────────────────────────────────────
+
+def pack_messages(messages: list[dict]) -> bytes:
+    """gzip'd NDJSON — one [id, role, content, created_at] array per line."""
+    lines = "".join(
+        json.dumps([m["id"], m["role"], m["content"], m["created_at"].isoformat()], separators=(",", ":"))
+        + "\n"
+        for m in messages
+    )
+    return gzip.compress(lines.encode())
+
+
+def _message(row: list) -> dict:
+    id_, role, content, created_at = row
+    return {"id": id_, "role": role, "content": content, "created_at": datetime.fromisoformat(created_at)}
+
+
+def iter_messages(payload: bytes) -> Iterator[dict]:
+    """Decode a blob incrementally, oldest first: the gzip stream is inflated
+    _UNPACK_CHUNK at a time and parsed line by line, so memory is bounded by
+    one chunk plus one message rather than the whole decompressed archive.
+
+    Blobs written before the NDJSON format (a single JSON array) are still
+    read, in one piece; the archiver rewrites them as NDJSON on its next merge."""
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)  # gzip container
+    buffer = b""
+    checked_format = False
+    for i in range(0, len(payload), _UNPACK_CHUNK):
+        buffer += decompressor.decompress(payload[i : i + _UNPACK_CHUNK])
+        if not checked_format and len(buffer) >= 2:
+            # NDJSON lines start with '["'; the legacy array with '[[' (or is '[]')
+            if buffer[1:2] in (b"[", b"]"):
+                yield from map(_message, json.loads(gzip.decompress(payload)))
+                return
+            checked_format = True
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield _message(json.loads(line))
+    buffer += decompressor.flush()
+    if not checked_format and buffer[1:2] in (b"[", b"]"):
+        yield from map(_message, json.loads(buffer))
+        return
+    for line in buffer.split(b"\n"):
+        if line:
+            yield _message(json.loads(line))
+
+
+def unpack_messages(payload: bytes) -> list[dict]:
+    return list(iter_messages(payload))
+
+
+def sort_key(message: dict) -> tuple[datetime, str]:
+    return message["created_at"], message["id"]
+
+
+def window_messages(
+    messages: Iterator[dict],
+    before: tuple[datetime, str] | None = None,
+    after: tuple[datetime, str] | None = None,
+    limit: int | None = None,
+    roles: Container[str] | None = None,
+) -> list[dict]:
+    """The newest `limit` messages strictly between `after` and `before`, oldest
+    first. `messages` must be in sort_key order, as a blob is: reading stops at
+    `before`, and only `limit` messages are held at a time."""
+    window: deque[dict] = deque(maxlen=limit)
+    for message in messages:
+        key = sort_key(message)
+        if before is not None and key >= before:
+            break
+        if (after is None or key > after) and (roles is None or message["role"] in roles):
+            window.append(message)
+    return list(window)
+
+
+async def load_archived_messages(
+    db: AsyncSession,
+    conversation_id: str,
+    before: tuple[datetime, str] | None = None,
+    after: tuple[datetime, str] | None = None,
+    limit: int | None = None,
+    roles: Container[str] | None = None,
+) -> list[dict]:
+    """Archived messages of a conversation, oldest first — narrowed as in
+    window_messages. Empty if it has none."""
+    result = await db.execute(
+        select(ConversationArchive.payload).where(ConversationArchive.conversation_id == conversation_id)
+    )
+    payload = result.scalar_one_or_none()
+    if payload is None:
+        return []
+    return window_messages(iter_messages(payload), before, after, limit, roles)
+
+
+async def stream_archived_messages(db: AsyncSession, conversation_id: str) -> AsyncIterator[dict]:
+    """Like load_archived_messages, but decoded one message at a time."""
+    result = await db.execute(
+        select(ConversationArchive.payload).where(ConversationArchive.conversation_id == conversation_id)
+    )
+    payload = result.scalar_one_or_none()
+    if payload is None:
+        return
+    for message in iter_messages(payload):
+        yield message
+
+
+# ── Background compaction ────────────────────────────────────────────────────
+
+class ConversationArchiver:
+    """Periodically moves the messages of idle conversations into their archive blob.
+
+    A conversation is idle when its newest row in `messages` is older than
+    ARCHIVE_IDLE_DAYS. Archived conversations stay readable: chat_service merges
+    the blob back in when a read reaches past the hot rows of a conversation
+    whose archived_count is set. If an archived
+    conversation gets new messages, those are folded into the same blob once
+    it goes idle again."""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        self._conversations_archived = 0
+        self._messages_archived = 0
+
+    async def run_once(self) -> int:
+        """Archive up to ARCHIVE_BATCH_SIZE idle conversations. Returns how many."""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.ARCHIVE_IDLE_DAYS)
+        async with async_session() as db:
+            result = await db.execute(
+                select(Message.conversation_id)
+                .group_by(Message.conversation_id)
+                .having(func.max(Message.created_at) < cutoff)
+                .limit(settings.ARCHIVE_BATCH_SIZE)
+            )
+            conversation_ids = result.scalars().all()
+
+        archived = 0
+        for conversation_id in conversation_ids:
+            try:
+                await self._archive(conversation_id)
+                archived += 1
+            except Exception:
+                logger.exception(f"[ARCHIVE] Failed to archive conversation {conversation_id}")
+        if archived:
+            logger.info(f"[ARCHIVE] Archived {archived} idle conversations")
+        return archived
+
+    async def _archive(self, conversation_id: str) -> None:
+        async with async_session() as db:
+            result = await db.execute(
+                select(Message.id, Message.role, Message.content, Message.created_at)
+                .where(Message.conversation_id == conversation_id)
+            )
+            hot = [row._asdict() for row in result.all()]
+            if not hot:
+                return
+
+            result = await db.execute(
+                select(ConversationArchive)
+                .where(ConversationArchive.conversation_id == conversation_id)
+                .with_for_update()
+            )
+            archive = result.scalar_one_or_none()
+            merged = {m["id"]: m for m in unpack_messages(archive.payload)} if archive else {}
+            merged.update((m["id"], m) for m in hot)
+            messages = sorted(merged.values(), key=sort_key)
+
+            if archive is None:
+                archive = ConversationArchive(conversation_id=conversation_id, payload=b"", message_count=0)
+                db.add(archive)
+            archive.payload = pack_messages(messages)
+            archive.message_count = len(messages)
+            archive.archived_at = datetime.now(timezone.utc)
+            await db.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .values(archived_count=len(messages))
+            )
+
+            # Delete exactly the rows that went into the blob — a message written
+            # meanwhile stays hot and is picked up by a later run
+            ids = [m["id"] for m in hot]
+            for i in range(0, len(ids), _DELETE_CHUNK):
+                await db.execute(delete(Message).where(Message.id.in_(ids[i : i + _DELETE_CHUNK])))
+            await db.commit()
+
+        self._conversations_archived += 1
+        self._messages_archived += len(hot)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.ARCHIVE_INTERVAL)
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("[ARCHIVE] Compaction run failed")
+
+    def start(self) -> None:
+        if settings.ARCHIVE_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.ARCHIVE_ENABLED,
+            "conversations_archived": self._conversations_archived,
+            "messages_archived": self._messages_archived,
+        }
+
+
+conversation_archiver = ConversationArchiver()
@@ -1,114 +1,521 @@
-"""Async chat/conversation helpers — PostgreSQL backed."""
+"""Async chat/conversation helpers — DB backed, with write-behind message inserts."""
 
-from sqlalchemy import select
+import asyncio
+import base64
+import binascii
+import contextlib
+import json
+import logging
+import time
+import uuid
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, insert, select, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from backend.models import Conversation, Message
 
+from backend.config import settings
+from backend.database import async_session, insert as upsert
+from backend.models import Conversation, ConversationSummary, Message
+from backend.services.archive_service import load_archived_messages, sort_key, stream_archived_messages
+from backend.store import IdCache
 
-async def get_or_create_conversation(db: AsyncSession, session_id: str, symbol: str) -> Conversation:
-    """Get existing conversation for session+symbol, or create a new one."""
+logger = logging.getLogger(__name__)
+
+
+# ── Write-behind message writer ──────────────────────────────────────────────
+
+class MessageQueueFullError(RuntimeError):
+    """Raised by add_message when MESSAGE_QUEUE_MAX rows are already unwritten."""
+
+
+class MessageWriter:
+    """Batches message inserts across conversations.
+
+    add_message enqueues a row with its id and created_at assigned up front;
+    timestamps are strictly increasing, so order is fixed at enqueue time.
+    A background task flushes the queue as one multi-row INSERT in a single
+    transaction, MESSAGE_FLUSH_INTERVAL after the first pending row (sooner
+    if MESSAGE_FLUSH_MAX_BATCH rows are waiting). Reads flush first, so they
+    always see their own writes.
+
+    While the database is failing, background retries back off exponentially
+    up to MESSAGE_RETRY_MAX_BACKOFF, and enqueue refuses new rows once
+    MESSAGE_QUEUE_MAX are waiting rather than growing without bound."""
+
+    def __init__(self):
+        self._pending: list[dict] = []
+        # message id -> (session_id, symbol), to re-resolve a stale conversation_id
+        self._owners: dict[str, tuple[str, str]] = {}
+        self._pending_event = asyncio.Event()
+        self._full_event = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._last_created_at: datetime | None = None
+        self._task: asyncio.Task | None = None
+        self._failures = 0          # consecutive failed flushes; 0 when healthy
+        self._outage_start = 0.0
+        self._rejected = 0
+
+    def _next_timestamp(self) -> datetime:
+        now = datetime.now(timezone.utc)
+        if self._last_created_at is not None and now <= self._last_created_at:
+            now = self._last_created_at + timedelta(microseconds=1)
+        self._last_created_at = now
+        return now
+
+    def enqueue(
+        self, session_id: str, symbol: str, conversation_id: str, role: str, content: str
+    ) -> Message:
+        """Queue a message for insertion and return it (not yet persisted).
+        Raises MessageQueueFullError if MESSAGE_QUEUE_MAX rows are already waiting."""
+        if len(self._pending) >= settings.MESSAGE_QUEUE_MAX:
+            self._rejected += 1
+            raise MessageQueueFullError(
+                f"{len(self._pending)} messages are waiting to be written — database unavailable?"
+            )
+        row = {
+            "id": str(uuid.uuid4()),
+            "conversation_id": conversation_id,
+            "role": role,
+            "content": content,
+            "created_at": self._next_timestamp(),
+        }
+        self._pending.append(row)
+        self._owners[row["id"]] = (session_id, symbol)
+        self._pending_event.set()
+        if len(self._pending) >= settings.MESSAGE_FLUSH_MAX_BATCH:
+            self._full_event.set()
+        self.start()
+        return Message(**row)
+
+    async def flush(self) -> None:
+        """Write every pending message now."""
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[: settings.MESSAGE_FLUSH_MAX_BATCH]
+                del self._pending[: len(batch)]
+                try:
+                    async with async_session() as db:
+                        await db.execute(insert(Message).values(batch))
+                        await db.commit()
+                except IntegrityError:
+                    # e.g. a conversation deleted mid-stream — isolate the bad rows
+                    if not await self._insert_one_by_one(batch):
+                        return
+                except asyncio.CancelledError:
+                    # Shutdown mid-flush — keep the batch for the final flush
+                    self._pending[:0] = batch
+                    raise
+                except Exception as e:  # noqa: BLE001 — kept for retry with backoff
+                    self._pending[:0] = batch
+                    self._record_failure(e)
+                    return
+                for row in batch:
+                    self._owners.pop(row["id"], None)
+                self._record_success()
+
+    async def _insert_one_by_one(self, batch: list[dict]) -> bool:
+        """Insert rows separately. A row whose conversation is gone is moved to
+        the conversation re-resolved (or recreated) from its (session_id, symbol);
+        one that still violates a constraint is dropped.
+        Returns False (with the rest re-queued) if the database failed."""
+        for i, row in enumerate(batch):
+            try:
+                try:
+                    async with async_session() as db:
+                        await db.execute(insert(Message).values(row))
+                        await db.commit()
+                except IntegrityError as e:
+                    # Typically a stale cached ID — the conversation was deleted,
+                    # possibly by another worker
+                    conversation_ids.invalidate_value(row["conversation_id"])
+                    if not await self._reinsert(row):
+                        logger.warning(f"[WRITER] Dropping message {row['id']} — {type(e).__name__}: {e}")
+                self._owners.pop(row["id"], None)
+            except asyncio.CancelledError:
+                self._pending[:0] = batch[i:]
+                raise
+            except Exception as e:  # noqa: BLE001 — kept for retry with backoff
+                self._pending[:0] = batch[i:]
+                self._record_failure(e)
+                return False
+        return True
+
+    async def _reinsert(self, row: dict) -> bool:
+        """Retry a row against its re-resolved conversation. False if there is
+        nothing to retarget, or the insert still violates a constraint."""
+        owner = self._owners.get(row["id"])
+        if owner is None:
+            return False
+        async with async_session() as db:
+            conv = await get_or_create_conversation(db, *owner)
+            if conv.id == row["conversation_id"]:
+                # The conversation exists — the row itself is bad
+                return False
+            logger.info(
+                f"[WRITER] Conversation {row['conversation_id']} is gone — "
+                f"moving message {row['id']} to {conv.id}"
+            )
+            row["conversation_id"] = conv.id
+            try:
+                await db.execute(insert(Message).values(row))
+                await db.commit()
+            except IntegrityError:
+                return False
+        return True
+
+    def _record_failure(self, error: Exception) -> None:
+        # Log the outage once, not on every retry
+        if self._failures == 0:
+            self._outage_start = time.monotonic()
+            logger.error(
+                f"[WRITER] Flush failed, retrying with backoff "
+                f"({len(self._pending)} messages pending) — {type(error).__name__}: {error}"
+            )
+        self._failures += 1
+        self._pending_event.set()
+
+    def _record_success(self) -> None:
+        if self._failures:
+            logger.info(
+                f"[WRITER] Database writes recovered after {self._failures} failed flushes "
+                f"({time.monotonic() - self._outage_start:.1f}s)"
+            )
+            self._failures = 0
+
+    def _backoff(self) -> float:
+        """Seconds to wait before the next background retry."""
+        return min(
+            settings.MESSAGE_FLUSH_INTERVAL * 2 ** self._failures,
+            settings.MESSAGE_RETRY_MAX_BACKOFF,
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await self._pending_event.wait()
+            # Let a batch accumulate, unless it is already full
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._full_event.wait(), timeout=settings.MESSAGE_FLUSH_INTERVAL)
+            self._pending_event.clear()
+            self._full_event.clear()
+            await self.flush()
+            if self._failures:
+                await asyncio.sleep(self._backoff())
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and flush whatever is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "max_pending": settings.MESSAGE_QUEUE_MAX,
+            "consecutive_failures": self._failures,
+            "rejected": self._rejected,
+        }
+
+
+message_writer = MessageWriter()
+
+
+# ── Conversation helpers ─────────────────────────────────────────────────────
+
+# (session_id, symbol) -> conversation_id, for conversations known to exist
+conversation_ids = IdCache(settings.CONVERSATION_ID_CACHE_MAX_ENTRIES)
+
+
+async def _select_conversation(db: AsyncSession, session_id: str, symbol: str) -> Conversation | None:
     result = await db.execute(
         select(Conversation).where(
             Conversation.session_id == session_id,
             Conversation.symbol == symbol,
         )
     )
-    conv = result.scalar_one_or_none()
+    return result.scalar_one_or_none()
+
+
+async def get_or_create_conversation(db: AsyncSession, session_id: str, symbol: str) -> Conversation:
+    """Get existing conversation for session+symbol, or create a new one."""
+    conv = await _select_conversation(db, session_id, symbol)
     if conv is None:
-        conv = Conversation(session_id=session_id, symbol=symbol)
-        db.add(conv)
+        # Race-free create: a concurrent request may insert the same (session_id, symbol)
+        await db.execute(
+            upsert(Conversation)
+            .values(session_id=session_id, symbol=symbol)
+            .on_conflict_do_nothing(index_elements=["session_id", "symbol"])
+        )
         await db.commit()
-        await db.refresh(conv)
+        conv = await _select_conversation(db, session_id, symbol)
+    conversation_ids.put((session_id, symbol), conv.id)
     return conv
 
 
+async def get_conversation_id(
+    db: AsyncSession, session_id: str, symbol: str, create: bool = False
+) -> str | None:
+    """Conversation ID for session+symbol, from the in-process cache when known.
+    Returns None if there is no conversation and `create` is False."""
+    conv_id = conversation_ids.get((session_id, symbol))
+    if conv_id is not None:
+        return conv_id
+    if create:
+        return (await get_or_create_conversation(db, session_id, symbol)).id
+    conv = await _select_conversation(db, session_id, symbol)
+    if conv is None:
+        return None
+    conversation_ids.put((session_id, symbol), conv.id)
+    return conv.id
+
+
 async def add_message(db: AsyncSession, session_id: str, symbol: str, role: str, content: str) -> Message:
-    """Append a message to the conversation (creates conversation if needed)."""
-    conv = await get_or_create_conversation(db, session_id, symbol)
-    msg = Message(conversation_id=conv.id, role=role, content=content)
-    db.add(msg)
-    await db.commit()
-    await db.refresh(msg)
-    return msg
+    """Append a message to the conversation (creates conversation if needed).
+    The insert is write-behind: it is batched and committed by message_writer."""
+    conv_id = await get_conversation_id(db, session_id, symbol, create=True)
+    return message_writer.enqueue(session_id, symbol, conv_id, role, content)
 
 
-async def get_messages(
-    db: AsyncSession, session_id: str, symbol: str, limit: int = 50, before: str | None = None
-) -> tuple[list[dict], bool]:
-    """Return (messages_list, has_more) for pagination."""
-    conv_result = await db.execute(
-        select(Conversation).where(
-            Conversation.session_id == session_id,
-            Conversation.symbol == symbol,
+# ── Keyset cursors ───────────────────────────────────────────────────────────
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(created_at: datetime, message_id: str) -> str:
+    """Opaque cursor for the (created_at, id) position of a message."""
+    raw = f"{created_at.isoformat()}|{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, message_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), message_id
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from e
+
+
+async def _select_hot_messages(
+    db: AsyncSession, conv_id: str, join_on, order_by: tuple, limit: int | None
+) -> tuple[int, list[dict]]:
+    """(archived_count, rows) in one round trip: the conversation outer-joined to
+    its messages matching `join_on`, so the count comes back even when no
+    message does. Reads skip the archive entirely while the count is 0."""
+    query = (
+        select(
+            Conversation.archived_count, Message.id, Message.role, Message.content, Message.created_at
         )
+        .outerjoin(Message, join_on)
+        .where(Conversation.id == conv_id)
+        .order_by(*order_by)
+        .limit(limit)
     )
-    conv = conv_result.scalar_one_or_none()
-    if conv is None:
-        return [], False
+    result = (await db.execute(query)).all()
+    if not result:
+        return 0, []
+    rows = [
+        {"id": r.id, "role": r.role, "content": r.content, "created_at": r.created_at}
+        for r in result
+        if r.id is not None
+    ]
+    return result[0].archived_count, rows
+
 
-    query = select(Message).where(Message.conversation_id == conv.id)
+async def get_messages(
+    db: AsyncSession, session_id: str, symbol: str, limit: int = 50, cursor: str | None = None
+) -> tuple[list[dict], str | None]:
+    """Return (messages_list, next_cursor) for pagination, oldest first.
+
+    Pages walk backwards from the newest message. `cursor` is the next_cursor
+    of the previous page; next_cursor is None once the start is reached.
+    Raises InvalidCursorError for a malformed cursor."""
+    position = decode_cursor(cursor) if cursor else None
+    await message_writer.flush()
+    conv_id = await get_conversation_id(db, session_id, symbol)
+    if conv_id is None:
+        return [], None
 
-    if before:
-        # Get the created_at of the "before" message for cursor pagination
-        before_result = await db.execute(select(Message.created_at).where(Message.id == before))
-        before_ts = before_result.scalar_one_or_none()
-        if before_ts is not None:
-            query = query.where(Message.created_at < before_ts)
+    # Keyset on (created_at, id) — served by ix_messages_conversation_created_at_id
+    join_on = Message.conversation_id == Conversation.id
+    if position is not None:
+        join_on = and_(join_on, tuple_(Message.created_at, Message.id) < position)
+    archived_count, rows = await _select_hot_messages(
+        db,
+        conv_id,
+        join_on,
+        order_by=(Message.created_at.desc(), Message.id.desc()),
+        limit=limit + 1,
+    )
 
-    query = query.order_by(Message.created_at.desc()).limit(limit + 1)
-    result = await db.execute(query)
-    rows = result.scalars().all()
+    if len(rows) <= limit and archived_count:
+        # Reached the oldest hot row — continue into the archive
+        archived = await load_archived_messages(db, conv_id, before=position, limit=limit + 1)
+        rows = sorted(rows + archived, key=sort_key, reverse=True)[: limit + 1]
 
-    has_more = len(rows) > limit
     messages = rows[:limit]
+    next_cursor = (
+        encode_cursor(messages[-1]["created_at"], messages[-1]["id"]) if len(rows) > limit else None
+    )
     messages.reverse()  # oldest first
 
-    return [
-        {
-            "id": m.id,
-            "role": m.role,
-            "content": m.content,
-            "created_at": m.created_at.isoformat(),
-        }
-        for m in messages
-    ], has_more
+    return [{**m, "created_at": m["created_at"].isoformat()} for m in messages], next_cursor
 
 
-async def get_conversation_history(db: AsyncSession, session_id: str, symbol: str) -> list[dict]:
-    """Full history as list of {role, content} dicts for agent memory."""
-    conv_result = await db.execute(
-        select(Conversation).where(
-            Conversation.session_id == session_id,
-            Conversation.symbol == symbol,
-        )
-    )
-    conv = conv_result.scalar_one_or_none()
-    if conv is None:
+async def get_conversation_history(
+    db: AsyncSession,
+    session_id: str,
+    symbol: str,
+    limit: int | None = None,
+    after: tuple[datetime, str] | None = None,
+) -> list[dict]:
+    """History as list of {role, content, created_at, id} dicts for agent memory,
+    oldest first. With `limit`, only the most recent `limit` messages are loaded;
+    with `after`, only messages past that (created_at, id) position."""
+    await message_writer.flush()
+    conv_id = await get_conversation_id(db, session_id, symbol)
+    if conv_id is None:
         return []
 
+    roles = ("user", "assistant")
+    join_on = and_(Message.conversation_id == Conversation.id, Message.role.in_(roles))
+    if after is not None:
+        join_on = and_(join_on, tuple_(Message.created_at, Message.id) > after)
+    archived_count, rows = await _select_hot_messages(
+        db,
+        conv_id,
+        join_on,
+        order_by=(Message.created_at, Message.id)
+        if limit is None
+        else (Message.created_at.desc(), Message.id.desc()),
+        limit=limit,
+    )
+
+    if (limit is None or len(rows) < limit) and archived_count:
+        # Older turns are in the archive
+        rows += await load_archived_messages(db, conv_id, after=after, limit=limit, roles=roles)
+    rows.sort(key=sort_key)
+    if limit is not None:
+        rows = rows[-limit:]
+    return [
+        {"role": m["role"], "content": m["content"], "created_at": m["created_at"], "id": m["id"]}
+        for m in rows
+    ]
+
+
+async def get_memory_summary(
+    db: AsyncSession, session_id: str, symbol: str
+) -> tuple[str, tuple[datetime, str] | None]:
+    """(summary, folded_through): the stored rolling summary of the conversation's
+    older turns and the (created_at, id) of the last message it covers.
+    ("", None) if there is none."""
+    conv_id = await get_conversation_id(db, session_id, symbol)
+    if conv_id is None:
+        return "", None
     result = await db.execute(
-        select(Message)
-        .where(
-            Message.conversation_id == conv.id,
-            Message.role.in_(["user", "assistant"]),
-        )
-        .order_by(Message.created_at)
+        select(
+            ConversationSummary.summary,
+            ConversationSummary.folded_through_at,
+            ConversationSummary.folded_through_id,
+        ).where(ConversationSummary.conversation_id == conv_id)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return "", None
+    folded_through = (
+        (row.folded_through_at, row.folded_through_id) if row.folded_through_id is not None else None
     )
-    return [{"role": m.role, "content": m.content} for m in result.scalars().all()]
+    return row.summary, folded_through
+
+
+async def save_memory_summary(
+    session_id: str, symbol: str, summary: str, folded_through: tuple[datetime, str] | None
+) -> None:
+    """Upsert the rolling summary and its watermark. Uses its own DB session,
+    since it runs in the background after a turn has finished."""
+    async with async_session() as db:
+        conv_id = await get_conversation_id(db, session_id, symbol)
+        if conv_id is None:
+            return
+        at, message_id = folded_through or (None, None)
+        stmt = upsert(ConversationSummary).values(
+            conversation_id=conv_id, summary=summary, folded_through_at=at, folded_through_id=message_id
+        )
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["conversation_id"],
+                set_={
+                    "summary": stmt.excluded.summary,
+                    "folded_through_at": stmt.excluded.folded_through_at,
+                    "folded_through_id": stmt.excluded.folded_through_id,
+                    "updated_at": datetime.now(timezone.utc),
+                },
+            )
+        )
+        await db.commit()
 
 
 async def delete_conversation(db: AsyncSession, session_id: str, symbol: str) -> bool:
     """Delete a conversation and its messages. Returns True if it existed."""
-    conv_result = await db.execute(
-        select(Conversation).where(
-            Conversation.session_id == session_id,
-            Conversation.symbol == symbol,
-        )
-    )
-    conv = conv_result.scalar_one_or_none()
+    await message_writer.flush()
+    conversation_ids.invalidate((session_id, symbol))
+    conv = await _select_conversation(db, session_id, symbol)
     if conv is None:
         return False
 
     await db.delete(conv)
     await db.commit()
     return True
+
+
+# ── Export ───────────────────────────────────────────────────────────────────
+
+def _export_line(conv: Conversation, message: dict) -> str:
+    return json.dumps({
+        "conversation_id": conv.id,
+        "symbol": conv.symbol,
+        "id": message["id"],
+        "role": message["role"],
+        "content": message["content"],
+        "created_at": message["created_at"].isoformat(),
+    }) + "\n"
+
+
+async def export_messages(session_id: str, symbol: str | None = None) -> AsyncIterator[str]:
+    """Yield every message of a session's conversations (or just `symbol`'s) as
+    NDJSON lines, oldest first per conversation.
+
+    Hot rows come from a server-side cursor, EXPORT_YIELD_PER at a time, and
+    archive blobs are inflated incrementally, so memory stays flat however
+    long the conversation. Uses its own DB session,
+    since it runs while the response is being sent."""
+    await message_writer.flush()
+    async with async_session() as db:
+        query = select(Conversation).where(Conversation.session_id == session_id)
+        if symbol is not None:
+            query = query.where(Conversation.symbol == symbol)
+        result = await db.execute(query.order_by(Conversation.symbol))
+        conversations = result.scalars().all()
+
+        for conv in conversations:
+            # Archived messages predate every hot row of the conversation
+            async for message in stream_archived_messages(db, conv.id):
+                yield _export_line(conv, message)
+
+            stream = await db.stream(
+                select(Message.id, Message.role, Message.content, Message.created_at)
+                .where(Message.conversation_id == conv.id)
+                .order_by(Message.created_at, Message.id)
+                .execution_options(yield_per=settings.EXPORT_YIELD_PER)
+            )
+            async for row in stream.mappings():
+                yield _export_line(conv, row)
@@ -0,0 +1,110 @@
+"""Shared per-symbol quote pollers, fanned out to WebSocket subscribers."""
+
+import asyncio
+import contextlib
+import logging
+
+from backend.config import settings
+from backend.services.stock_service import get_stock_quote
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteBroadcaster:
+    """One poller task per subscribed symbol, however many clients watch it.
+
+    Each connection owns a queue and subscribes it to symbols. A symbol's poller
+    starts with its first subscriber and is cancelled with its last, so upstream
+    calls scale with distinct symbols, not connections. Updates are only pushed
+    when the quote changed. A slow client's queue drops its oldest update
+    rather than block the poller.
+
+    Polls go through get_stock_quote and so through the tool cache: a symbol
+    updates at most once per quote TTL (plus one poll interval while a stale
+    entry is being revalidated), which is why QUOTE_STREAM_INTERVAL defaults
+    to that TTL."""
+
+    def __init__(self):
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._pollers: dict[str, asyncio.Task] = {}
+        self._latest: dict[str, dict] = {}
+        self._polls = 0
+        self._updates = 0
+        self._dropped = 0
+
+    def subscribe(self, symbol: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.setdefault(symbol, set())
+        if queue in subscribers:
+            return
+        subscribers.add(queue)
+        # A late joiner gets the current quote straight away
+        latest = self._latest.get(symbol)
+        if latest is not None:
+            self._put(queue, latest)
+        if symbol not in self._pollers:
+            self._pollers[symbol] = asyncio.create_task(self._poll(symbol))
+
+    def unsubscribe(self, symbol: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(symbol)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if subscribers:
+            return
+        del self._subscribers[symbol]
+        self._latest.pop(symbol, None)
+        task = self._pollers.pop(symbol, None)
+        if task is not None:
+            task.cancel()
+
+    def _put(self, queue: asyncio.Queue, message: dict) -> None:
+        if queue.full():
+            queue.get_nowait()
+            self._dropped += 1
+        queue.put_nowait(message)
+
+    def _publish(self, symbol: str, message: dict) -> None:
+        self._latest[symbol] = message
+        self._updates += 1
+        for queue in self._subscribers.get(symbol, ()):
+            self._put(queue, message)
+
+    async def _poll(self, symbol: str) -> None:
+        while True:
+            self._polls += 1
+            try:
+                quote = await get_stock_quote(symbol)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa: BLE001 — any failure becomes an error frame
+                logger.warning(f"[QUOTE STREAM] Poll failed for {symbol} — {type(e).__name__}: {e}")
+                message = {"type": "error", "symbol": symbol, "content": str(e) or type(e).__name__}
+            else:
+                message = {"type": "quote", "symbol": symbol, "quote": quote}
+            if message != self._latest.get(symbol):
+                self._publish(symbol, message)
+            await asyncio.sleep(settings.QUOTE_STREAM_INTERVAL)
+
+    async def stop(self) -> None:
+        """Cancel every poller."""
+        tasks = list(self._pollers.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._pollers.clear()
+        self._subscribers.clear()
+        self._latest.clear()
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self._pollers),
+            "subscriptions": sum(len(s) for s in self._subscribers.values()),
+            "polls": self._polls,
+            "updates": self._updates,
+            "dropped": self._dropped,
+        }
+
+
+quote_broadcaster = QuoteBroadcaster()
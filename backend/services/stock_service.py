@@ -1,24 +1,18 @@
-import json
+import asyncio
 import logging
-import math
-
-import httpx
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 
+from backend import json_utils
 from backend.agent_manager import agent_manager
+from backend.config import settings
+from backend.http_client import get_http_client
+from backend.services.symbol_index import SymbolEntry, symbol_index
+from backend.tool_utils import SingleFlight, tool_cache
 
 logger = logging.getLogger(__name__)
 
-
-def _sanitize(obj):
-    """Replace NaN/Infinity floats with None and stringify non-serializable keys."""
-    if isinstance(obj, float) and (math.isnan(obj) or math.isinf(obj)):
-        return None
-    if isinstance(obj, dict):
-        return {str(k): _sanitize(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [_sanitize(v) for v in obj]
-    return obj
-
 YAHOO_SEARCH_URL = "https://query2.finance.yahoo.com/v1/finance/search"
 
 # Indian exchanges only
@@ -28,15 +22,106 @@ SUPPORTED_EXCHANGES = {"NSI", "NSE", "BOM", "BSE"}
 async def get_stock_quote(symbol: str) -> dict:
     result = await agent_manager.call_tool("get_stock_quote", {"symbol": symbol})
     if isinstance(result, str):
-        return json.loads(result)
+        return json_utils.loads(result)
     return result
 
 
-async def get_stock_fundamentals(symbol: str) -> dict:
+@dataclass
+class QuoteResult:
+    quote: dict | None = None
+    age: float | None = None  # seconds since the quote was fetched upstream
+    error: str | None = None
+
+    @property
+    def fresh(self) -> bool:
+        return self.age is not None and self.age < settings.TOOL_CACHE_TTL.get("get_stock_quote", 0)
+
+
+async def _cached_quote(symbol: str) -> QuoteResult | None:
+    """Fresh quote straight from ToolCache, or None."""
+    result, age = await tool_cache.peek("get_stock_quote", {"symbol": symbol})
+    if result is None:
+        return None
+    # The cache holds the raw MCP (content, artifact) pair; callers get the content
+    content = result[0] if isinstance(result, tuple) else result
+    return QuoteResult(quote=json_utils.loads(content) if isinstance(content, str) else content, age=age)
+
+
+async def fetch_quotes(symbols: list[str]) -> dict[str, QuoteResult]:
+    """Quotes for many symbols, keyed by symbol.
+
+    Fresh quotes come straight from ToolCache; the rest are fetched through the
+    quote tool concurrently, at most QUOTE_FANOUT_CONCURRENCY at a time. One
+    symbol failing doesn't fail the batch — its result carries the error."""
+    results: dict[str, QuoteResult] = {}
+    misses = []
+    for symbol in symbols:
+        cached = await _cached_quote(symbol)
+        if cached is not None:
+            results[symbol] = cached
+        else:
+            misses.append(symbol)
+
+    semaphore = asyncio.Semaphore(settings.QUOTE_FANOUT_CONCURRENCY)
+
+    async def fetch(symbol: str) -> None:
+        async with semaphore:
+            try:
+                quote = await get_stock_quote(symbol)
+            except Exception as e:  # noqa: BLE001 — reported per symbol
+                logger.warning(f"Quote fetch failed for {symbol} — {type(e).__name__}: {e}")
+                results[symbol] = QuoteResult(error=str(e) or type(e).__name__)
+                return
+            # The tool may have answered from a stale cache entry (SWR or fallback)
+            results[symbol] = QuoteResult(quote=quote, age=await tool_cache.age("get_stock_quote", {"symbol": symbol}))
+
+    await asyncio.gather(*(fetch(symbol) for symbol in misses))
+    logger.info(
+        f"Batch quotes: {len(symbols)} symbols, {len(symbols) - len(misses)} from cache, "
+        f"{sum(r.error is not None for r in results.values())} failed"
+    )
+    return {symbol: results[symbol] for symbol in symbols}
+
+
+async def get_stock_quotes(symbols: list[str]) -> dict:
+    """Batch quotes as {"quotes": {symbol: quote}, "errors": {symbol: message}}."""
+    results = await fetch_quotes(symbols)
+    return {
+        "quotes": {symbol: r.quote for symbol, r in results.items() if r.error is None},
+        "errors": {symbol: r.error for symbol, r in results.items() if r.error is not None},
+    }
+
+
+def project(data: dict, fields: list[str]) -> dict:
+    """Keep only the given dotted paths of a nested dict, e.g. "info.trailingPE".
+    Paths that don't exist are left out; a path ending on a dict keeps all of it."""
+    projected: dict = {}
+    # Shorter paths first, so "info" wins over "info.trailingPE"
+    for keys in sorted((path.split(".") for path in fields), key=len):
+        value = data
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target.setdefault(keys[-1], value)
+    return projected
+
+
+async def get_stock_fundamentals(symbol: str, fields: list[str] | None = None) -> dict:
+    """Fundamentals for a symbol, narrowed to `fields` (dotted paths) if given.
+    The projection runs on the ToolCache result, so it costs no extra tool call."""
     result = await agent_manager.call_tool("get_stock_fundamentals", {"ticker": symbol})
     if isinstance(result, str):
-        result = json.loads(result)
-    return _sanitize(result)
+        result = json_utils.loads(result)
+    else:
+        result = json_utils.sanitize(result)
+    if fields and isinstance(result, dict):
+        return project(result, fields)
+    return result
 
 
 async def get_stock_news(symbol: str, stock_name: str, limit: int = 10) -> dict:
@@ -45,38 +130,93 @@ async def get_stock_news(symbol: str, stock_name: str, limit: int = 10) -> dict:
         {"ticker": symbol, "stock_name": stock_name, "max_items": limit},
     )
     if isinstance(result, str):
-        return json.loads(result)
+        return json_utils.loads(result)
     return result
 
 
 async def search_stocks(query: str) -> list[dict]:
-    """Search stocks via Yahoo Finance autocomplete API."""
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                YAHOO_SEARCH_URL,
-                params={"q": query, "quotesCount": 10, "newsCount": 0},
-                headers={"User-Agent": "Mozilla/5.0"},
-                timeout=5.0,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-
-        results = []
-        for quote in data.get("quotes", []):
-            exchange = quote.get("exchange", "")
-            quote_type = quote.get("quoteType", "")
-            # Only include equities from supported exchanges
-            if quote_type != "EQUITY" or exchange not in SUPPORTED_EXCHANGES:
-                continue
-            results.append({
-                "symbol": quote.get("symbol", ""),
-                "name": quote.get("shortname") or quote.get("longname", ""),
-                "exchange": exchange,
-                "type": quote_type,
-            })
+    """Search stocks in the local symbol index, falling back to Yahoo for
+    queries it has no match for. Yahoo's matches are added to the index."""
+    results = symbol_index.search(query)
+    if results:
         return results
-
+    results = await search_yahoo(query)
+    symbol_index.add([SymbolEntry(r["symbol"], r["name"], r["exchange"]) for r in results])
+    return results
+
+
+class SearchCache:
+    """LRU of Yahoo search results per normalized query, each kept for
+    YAHOO_SEARCH_CACHE_TTL seconds. Empty results are cached too, so an
+    unknown query doesn't go upstream on every keystroke."""
+
+    def __init__(self):
+        self._entries: OrderedDict[str, tuple[float, list[dict]]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, query: str) -> list[dict] | None:
+        entry = self._entries.get(query)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[query]
+            self._misses += 1
+            return None
+        self._entries.move_to_end(query)
+        self._hits += 1
+        return entry[1]
+
+    def put(self, query: str, results: list[dict]) -> None:
+        self._entries[query] = (time.monotonic() + settings.YAHOO_SEARCH_CACHE_TTL, results)
+        self._entries.move_to_end(query)
+        while len(self._entries) > settings.YAHOO_SEARCH_CACHE_MAX_ENTRIES:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+
+search_cache = SearchCache()
+_search_flight = SingleFlight()
+
+
+async def _fetch_yahoo(query: str) -> list[dict]:
+    resp = await get_http_client().get(
+        YAHOO_SEARCH_URL,
+        params={"q": query, "quotesCount": 10, "newsCount": 0},
+        timeout=5.0,
+    )
+    resp.raise_for_status()
+    data = resp.json()
+
+    results = []
+    for quote in data.get("quotes", []):
+        exchange = quote.get("exchange", "")
+        quote_type = quote.get("quoteType", "")
+        # Only include equities from supported exchanges
+        if quote_type != "EQUITY" or exchange not in SUPPORTED_EXCHANGES:
+            continue
+        results.append({
+            "symbol": quote.get("symbol", ""),
+            "name": quote.get("shortname") or quote.get("longname", ""),
+            "exchange": exchange,
+            "type": quote_type,
+        })
+    search_cache.put(query, results)
+    return results
+
+
+async def search_yahoo(query: str) -> list[dict]:
+    """Search stocks via Yahoo Finance autocomplete API.
+
+    Results are cached per normalized query, and identical searches in flight
+    at the same time share one upstream request. Failures aren't cached."""
+    query = " ".join(query.lower().split())
+    cached = search_cache.get(query)
+    if cached is not None:
+        return cached
+    try:
+        return await _search_flight.do(query, lambda: _fetch_yahoo(query))
     except Exception:
         logger.exception("Yahoo Finance search failed")
         return []
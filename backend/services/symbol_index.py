@@ -0,0 +1,229 @@
+"""In-memory prefix/trigram index over NSE/BSE equities for watchlist search."""
+
+import asyncio
+import bisect
+import contextlib
+import csv
+import io
+import logging
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from backend.config import settings
+from backend.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+# Yahoo's exchange codes, so local and remote results look the same
+NSE = "NSI"
+BSE = "BSE"
+
+_SUFFIXES = (".NS", ".BO")
+_NON_ALNUM = re.compile(r"[^A-Z0-9&]+")
+
+
+@dataclass(frozen=True)
+class SymbolEntry:
+    symbol: str
+    name: str
+    exchange: str
+
+    def to_result(self) -> dict:
+        return {"symbol": self.symbol, "name": self.name, "exchange": self.exchange, "type": "EQUITY"}
+
+
+def normalize(text: str) -> str:
+    """Uppercase, punctuation folded to single spaces."""
+    return _NON_ALNUM.sub(" ", text.upper()).strip()
+
+
+def _split_suffix(symbol: str) -> tuple[str, str | None]:
+    """(ticker, exchange suffix or None): TCS.BO -> ("TCS", ".BO")."""
+    upper = symbol.upper()
+    for suffix in _SUFFIXES:
+        if upper.endswith(suffix):
+            return upper[: -len(suffix)], suffix
+    return upper, None
+
+
+def _ticker(symbol: str) -> str:
+    """Symbol without its exchange suffix: TCS.NS -> TCS."""
+    return _split_suffix(symbol)[0]
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class SymbolIndex:
+    """Symbol search without a network round trip.
+
+    Two sorted key lists answer prefix queries by bisection: tickers, and the
+    words of company names. Queries of three or more characters that match no
+    prefix fall back to a trigram index over "ticker name", confirmed by a
+    substring check. Results rank exact ticker, ticker prefix, name-word prefix,
+    then substring matches. A query naming an exchange (TCS.BO) only matches
+    that exchange's listings."""
+
+    def __init__(self):
+        self._reset()
+        self._loaded_at: float | None = None
+        self._refresher: asyncio.Task | None = None
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ── Building ─────────────────────────────────────────────────────────────
+
+    def _reset(self) -> None:
+        self._entries: list[SymbolEntry] = []
+        self._by_symbol: dict[str, int] = {}
+        self._tickers: list[tuple[str, int]] = []
+        self._words: list[tuple[str, int]] = []
+        self._haystacks: list[str] = []
+        self._trigram_postings: dict[str, set[int]] = {}
+
+    def load(self, entries: list[SymbolEntry]) -> None:
+        """Replace the index contents. Runs without awaiting, so searches never
+        see a half-built index."""
+        self._reset()
+        self.add(entries)
+        self._loaded_at = time.time()
+        logger.info(f"[SYMBOLS] Indexed {len(self._entries)} symbols")
+
+    def add(self, entries: list[SymbolEntry]) -> None:
+        """Add entries not already indexed (e.g. learned from a remote search)."""
+        added = False
+        for entry in entries:
+            if entry.symbol in self._by_symbol:
+                continue
+            idx = len(self._entries)
+            self._entries.append(entry)
+            self._by_symbol[entry.symbol] = idx
+            ticker = normalize(_ticker(entry.symbol))
+            name = normalize(entry.name)
+            self._tickers.append((ticker, idx))
+            self._words.extend((word, idx) for word in set(name.split()))
+            haystack = f"{ticker} {name}"
+            self._haystacks.append(haystack)
+            for trigram in _trigrams(haystack):
+                self._trigram_postings.setdefault(trigram, set()).add(idx)
+            added = True
+        if added:
+            self._tickers.sort()
+            self._words.sort()
+
+    # ── Querying ─────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _prefixed(keys: list[tuple[str, int]], prefix: str):
+        i = bisect.bisect_left(keys, (prefix, -1))
+        while i < len(keys) and keys[i][0].startswith(prefix):
+            yield keys[i]
+            i += 1
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        ticker, suffix = _split_suffix(query.strip())
+        q = normalize(ticker)
+        if not q:
+            return []
+        found: dict[int, None] = {}  # insertion-ordered set
+
+        def take(indices) -> bool:
+            for idx in indices:
+                if suffix and not self._entries[idx].symbol.upper().endswith(suffix):
+                    continue
+                found.setdefault(idx)
+                if len(found) >= limit:
+                    return True
+            return False
+
+        exact = [idx for key, idx in self._prefixed(self._tickers, q) if key == q]
+        if not (
+            take(exact)
+            or take(idx for _, idx in self._prefixed(self._tickers, q))
+            or take(idx for _, idx in self._prefixed(self._words, q.split()[0]) if q in self._haystacks[idx])
+        ) and len(q) >= 3:
+            postings = sorted((self._trigram_postings.get(t, set()) for t in _trigrams(q)), key=len)
+            if postings and postings[0]:
+                candidates = set.intersection(*postings)
+                take(sorted(idx for idx in candidates if q in self._haystacks[idx]))
+
+        if found:
+            self._hits += 1
+        else:
+            self._misses += 1
+        return [self._entries[idx].to_result() for idx in found]
+
+    # ── Symbol master ────────────────────────────────────────────────────────
+
+    def load_bundled(self) -> None:
+        """Load the symbol master shipped with the app (symbol,name,exchange CSV)."""
+        path = Path(settings.SYMBOL_MASTER_PATH)
+        try:
+            with path.open(newline="", encoding="utf-8") as f:
+                entries = [
+                    SymbolEntry(row["symbol"], row["name"], row["exchange"])
+                    for row in csv.DictReader(f)
+                ]
+        except OSError:
+            logger.warning(f"[SYMBOLS] No symbol master at {path}; search falls back to Yahoo")
+            return
+        self.load(entries)
+
+    async def refresh(self) -> None:
+        """Rebuild from NSE's equity list (EQUITY_L.csv), keeping bundled entries.
+
+        The download only covers NSE. BSE listings come from the bundled master
+        and from Yahoo searches (a query ending in .BO with no local match goes
+        to Yahoo, and its results are added)."""
+        resp = await get_http_client().get(settings.SYMBOL_MASTER_URL, timeout=30.0)
+        resp.raise_for_status()
+        reader = csv.DictReader(io.StringIO(resp.text))
+        reader.fieldnames = [name.strip().upper() for name in reader.fieldnames or []]
+        downloaded = [
+            SymbolEntry(f"{row['SYMBOL'].strip()}.NS", row["NAME OF COMPANY"].strip(), NSE)
+            for row in reader
+            if row.get("SYMBOL") and row.get("NAME OF COMPANY")
+        ]
+        if not downloaded:
+            raise ValueError("symbol master download had no rows")
+        # Downloaded names win; anything only in the current index is kept
+        by_symbol = {entry.symbol: entry for entry in self._entries}
+        by_symbol.update((entry.symbol, entry) for entry in downloaded)
+        self.load(list(by_symbol.values()))
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:  # noqa: BLE001 — keep the current index and retry
+                logger.warning(f"[SYMBOLS] Symbol master refresh failed — {type(e).__name__}: {e}")
+            await asyncio.sleep(settings.SYMBOL_MASTER_REFRESH_INTERVAL)
+
+    def start_refresher(self) -> None:
+        """Periodically re-download the symbol master, if a URL is configured."""
+        if settings.SYMBOL_MASTER_URL and self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop_refresher(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._refresher
+            self._refresher = None
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self._entries),
+            "loaded_at": self._loaded_at,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+
+symbol_index = SymbolIndex()
@@ -1,15 +1,77 @@
-"""Session management — async PostgreSQL backed."""
+"""Session management — async DB backed, with an in-process cache of known IDs."""
+
+from collections import OrderedDict
+from collections.abc import Hashable
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.config import settings
+from backend.database import insert
 from backend.models import Session
 
 
+class IdCache:
+    """Bounded LRU map of keys to IDs that never change once created.
+
+    Only rows known to exist are cached, so a hit can skip the database
+    entirely. Whatever deletes a row must call `invalidate`."""
+
+    def __init__(self, max_entries: int):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[Hashable, str] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> str | None:
+        value = self._entries.get(key)
+        if value is None:
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return value
+
+    def put(self, key: Hashable, value: str) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def invalidate_value(self, value: str) -> None:
+        """Drop every key mapping to `value` (for when only the ID is known)."""
+        for key in [k for k, v in self._entries.items() if v == value]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._max_entries,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+known_sessions = IdCache(settings.SESSION_CACHE_MAX_ENTRIES)
+
+
 async def ensure_session(db: AsyncSession, session_id: str) -> str:
     """Register a session if not already known and return its ID."""
-    result = await db.execute(select(Session).where(Session.id == session_id))
+    if known_sessions.get(session_id) is not None:
+        return session_id
+
+    result = await db.execute(select(Session.id).where(Session.id == session_id))
     if result.scalar_one_or_none() is None:
-        db.add(Session(id=session_id))
+        # Upsert — concurrent first requests from one tab must not collide
+        await db.execute(
+            insert(Session).values(id=session_id).on_conflict_do_nothing(index_elements=["id"])
+        )
         await db.commit()
+    known_sessions.put(session_id, session_id)
     return session_id
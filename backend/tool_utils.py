@@ -1,16 +1,21 @@
-"""Tool resilience utilities — schema coercion, retry, timeout, circuit breaker, cache."""
+"""Tool resilience utilities — schema coercion, retry, timeout, circuit breaker, cache,
+single-flight coalescing."""
 
 import asyncio
+import contextlib
 import copy
 import json
 import logging
 import time
-from dataclasses import dataclass
+from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, field
 from typing import Any
 
 from groq import APIError
 from langchain_core.tools import StructuredTool
 
+from backend.cache_backends import CacheBackend, CacheEntry, create_cache_backend
 from backend.config import settings
 
 logger = logging.getLogger(__name__)
@@ -66,59 +71,238 @@ circuit_breaker = CircuitBreaker()
 
 # ── Tool Cache ───────────────────────────────────────────────────────────────
 
-@dataclass
-class CacheEntry:
-    result: Any
-    cached_at: float  # time.monotonic
+def _call_key(tool_name: str, arguments: dict) -> str:
+    """Stable key for a tool call — shared by the cache and single-flight."""
+    args_str = json.dumps(arguments, sort_keys=True, default=str)
+    return f"{tool_name}:{args_str}"
 
 
 class ToolCache:
-    """In-memory TTL cache for tool call results.
-    Also serves stale data as fallback when a tool call fails."""
+    """TTL cache for tool call results.
+    Also serves stale data as fallback when a tool call fails.
 
-    def __init__(self):
-        self._store: dict[str, CacheEntry] = {}
+    Storage is pluggable (see backend.cache_backends): a bounded per-process
+    LRU by default, or a SQLite file shared by all workers. A background
+    sweeper drops entries older than the stale-fallback horizon.
+
+    Entries past their TTL but inside TOOL_CACHE_SWR_GRACE are served as-is
+    while wrap_tool refreshes them in the background (stale-while-revalidate)."""
+
+    def __init__(self, backend: CacheBackend | None = None):
+        self._backend = backend or create_cache_backend()
+        self._hits = 0
+        self._misses = 0
+        self._revalidations = 0
+        self._expirations = 0
+        self._sweeper: asyncio.Task | None = None
 
     def _key(self, tool_name: str, arguments: dict) -> str:
-        args_str = json.dumps(arguments, sort_keys=True, default=str)
-        return f"{tool_name}:{args_str}"
+        return _call_key(tool_name, arguments)
 
-    def get(self, tool_name: str, arguments: dict) -> tuple[Any | None, bool]:
+    async def get(self, tool_name: str, arguments: dict) -> tuple[Any | None, bool]:
         """Return (cached_result, is_fresh). Returns (None, False) on miss."""
+        result, state, _ = await self.get_swr(tool_name, arguments)
+        return result, state == "fresh"
+
+    async def get_swr(self, tool_name: str, arguments: dict) -> tuple[Any | None, str, float | None]:
+        """Stale-while-revalidate lookup. Returns (cached_result, state, cached_at), where
+        state is "fresh", "revalidate" (past TTL but inside the grace window — serve it
+        and refresh in the background), "stale" (past the grace window) or "miss"."""
         key = self._key(tool_name, arguments)
-        entry = self._store.get(key)
+        entry = await self._backend.get(key)
         if entry is None:
-            return None, False
+            self._misses += 1
+            return None, "miss", None
 
         ttl = settings.TOOL_CACHE_TTL.get(tool_name, 0)
-        age = time.monotonic() - entry.cached_at
-        is_fresh = age < ttl
-        return entry.result, is_fresh
-
-    def get_stale(self, tool_name: str, arguments: dict) -> Any | None:
-        """Return cached result regardless of TTL (for fallback). None if no entry."""
+        grace = settings.TOOL_CACHE_SWR_GRACE.get(tool_name, 0)
+        age = time.time() - entry.cached_at
+        if age < ttl:
+            self._hits += 1
+            return entry.result, "fresh", entry.cached_at
+        if age < ttl + grace:
+            self._revalidations += 1
+            return entry.result, "revalidate", entry.cached_at
+        self._misses += 1
+        return entry.result, "stale", entry.cached_at
+
+    async def peek(self, tool_name: str, arguments: dict) -> tuple[Any | None, float | None]:
+        """Return (result, age_seconds) if a fresh entry exists, else (None, None).
+        A miss is not counted — callers fall back to calling the wrapped tool,
+        which counts it (and handles stale-while-revalidate)."""
+        entry = await self._backend.get(self._key(tool_name, arguments))
+        if entry is None:
+            return None, None
+        age = time.time() - entry.cached_at
+        if age >= settings.TOOL_CACHE_TTL.get(tool_name, 0):
+            return None, None
+        self._hits += 1
+        return entry.result, age
+
+    async def age(self, tool_name: str, arguments: dict) -> float | None:
+        """Seconds since the entry was cached, fresh or not. None if not cached."""
+        entry = await self._backend.get(self._key(tool_name, arguments))
+        return None if entry is None else time.time() - entry.cached_at
+
+    async def get_stale(self, tool_name: str, arguments: dict) -> Any | None:
+        """Return cached result regardless of TTL (for fallback). None if no entry
+        or if the entry is past the stale-fallback horizon."""
         key = self._key(tool_name, arguments)
-        entry = self._store.get(key)
+        entry = await self._backend.get(key)
         if entry is None:
             return None
-        age = time.monotonic() - entry.cached_at
+        age = time.time() - entry.cached_at
+        if age > settings.TOOL_CACHE_STALE_HORIZON:
+            await self._backend.delete(key)
+            self._expirations += 1
+            return None
         logger.info(
             f"[CACHE:{tool_name}] Returning STALE data (age={age:.0f}s) as fallback"
         )
         return entry.result
 
-    def put(self, tool_name: str, arguments: dict, result: Any) -> None:
+    async def put(self, tool_name: str, arguments: dict, result: Any) -> None:
         key = self._key(tool_name, arguments)
-        self._store[key] = CacheEntry(result=result, cached_at=time.monotonic())
+        await self._backend.put(key, CacheEntry(result=result, cached_at=time.time(), tool_name=tool_name))
         logger.debug(f"[CACHE:{tool_name}] Stored result, key={key[:80]}")
 
-    def clear(self) -> None:
-        self._store.clear()
+    async def sweep(self) -> int:
+        """Drop entries past the stale-fallback horizon. Returns the number removed."""
+        removed = await self._backend.sweep(time.time() - settings.TOOL_CACHE_STALE_HORIZON)
+        self._expirations += removed
+        return removed
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.TOOL_CACHE_SWEEP_INTERVAL)
+            removed = await self.sweep()
+            if removed:
+                logger.info(f"[CACHE] Sweeper removed {removed} expired entries")
+
+    def start_sweeper(self) -> None:
+        """Start the periodic background sweeper. Called once at startup."""
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._sweeper
+            self._sweeper = None
+
+    def stats(self) -> dict:
+        """Size and hit/miss/eviction counters."""
+        return {
+            **self._backend.stats(),
+            "max_bytes": settings.TOOL_CACHE_MAX_BYTES,
+            "hits": self._hits,
+            "misses": self._misses,
+            "revalidations": self._revalidations,
+            "expirations": self._expirations,
+        }
+
+    async def clear(self) -> None:
+        await self._backend.clear()
+
+    async def close(self) -> None:
+        """Release the storage backend (e.g. its SQLite connection). Called at shutdown."""
+        await self._backend.close()
 
 
 tool_cache = ToolCache()
 
 
+# ── Single-flight ────────────────────────────────────────────────────────────
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one upstream invocation.
+
+    The first caller for a key starts the call as a task; callers arriving
+    while it is in flight await the same task and share its result or error.
+    The task is shielded, so a cancelled caller never cancels the call for
+    everyone else."""
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    def _start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start(key, fn)
+        else:
+            logger.info(f"[SINGLEFLIGHT] Joining in-flight call, key={key[:80]}")
+        return await asyncio.shield(task)
+
+    def spawn(self, key: str, fn: Callable[[], Awaitable[Any]]) -> None:
+        """Start fn in the background unless a call for key is already in flight.
+        Its result is not awaited by anyone; errors are logged and dropped."""
+        if key not in self._inflight:
+            self._start(key, fn)
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved — every waiter may have been cancelled
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"[SINGLEFLIGHT] Call failed, key={key[:80]}: {task.exception()}")
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+
+single_flight = SingleFlight()
+
+
+# ── Per-run tool result tracking ─────────────────────────────────────────────
+
+@dataclass
+class ToolRun:
+    """What the wrapped tools served during one agent run."""
+
+    # Tools that answered from stale cache (SWR or failure fallback) or failed
+    degraded: set[str] = field(default_factory=set)
+    # Earliest time.time() at which any result served stops being fresh
+    # (its cached_at + TTL); None until a result is recorded
+    data_expires_at: float | None = None
+
+    def record(self, cached_at: float, ttl: int) -> None:
+        expires_at = cached_at + ttl
+        if self.data_expires_at is None or expires_at < self.data_expires_at:
+            self.data_expires_at = expires_at
+
+
+# Tool calls run in tasks that copy the caller's context, so they see — and
+# update — the ToolRun the caller installed.
+_tool_run: ContextVar[ToolRun | None] = ContextVar("tool_run", default=None)
+
+
+def track_tool_run() -> ToolRun:
+    """Start recording tool results in the current context. Returns the ToolRun
+    that wrapped tools update as they serve results."""
+    run = ToolRun()
+    _tool_run.set(run)
+    return run
+
+
+def _mark_degraded(tool_name: str) -> None:
+    run = _tool_run.get()
+    if run is not None:
+        run.degraded.add(tool_name)
+
+
+def _record_result(cached_at: float, ttl: int) -> None:
+    run = _tool_run.get()
+    if run is not None:
+        run.record(cached_at, ttl)
+
+
 # ── Output Guardrail ─────────────────────────────────────────────────────────
 
 # Phrases that indicate trading advice — checked case-insensitively
@@ -255,6 +439,9 @@ def wrap_tool(tool: StructuredTool) -> StructuredTool:
     2. Argument coercion — converts "true" → true before calling the MCP server
     3. Retry with timeout — retries failed tool calls, each with a timeout
     4. Circuit breaker — disables tool after too many consecutive failures
+    5. Single-flight — concurrent identical calls share one upstream invocation
+    6. Stale-while-revalidate — recently expired results are served immediately
+       while a background call refreshes the cache
     """
     original_schema = tool.args_schema
     original_coroutine = tool.coroutine
@@ -270,14 +457,40 @@ def wrap_tool(tool: StructuredTool) -> StructuredTool:
             fixed = coerce_tool_args(kwargs, raw_schema)
             ttl = settings.TOOL_CACHE_TTL.get(tool_name, 0)
 
-            # ── 1. Check fresh cache ──
+            key = _call_key(tool_name, fixed)
+
+            # ── 1. Check cache — fresh, or expired but within the SWR grace window ──
             if ttl > 0:
-                cached_result, is_fresh = tool_cache.get(tool_name, fixed)
-                if is_fresh:
+                cached_result, state, cached_at = await tool_cache.get_swr(tool_name, fixed)
+                if state == "fresh":
                     logger.info(f"[TOOL:{tool_name}] CACHE HIT (fresh, ttl={ttl}s)")
+                    _record_result(cached_at, ttl)
+                    return cached_result
+                if state == "revalidate":
+                    logger.info(f"[TOOL:{tool_name}] CACHE HIT (stale, revalidating in background)")
+                    single_flight.spawn(key, lambda: call_upstream(fixed, ttl))
+                    _mark_degraded(tool_name)
                     return cached_result
 
-            # ── 2. Circuit breaker check ──
+            # ── 2. Coalesce with any identical call already in flight ──
+            try:
+                result, fetched_at = await single_flight.do(key, lambda: call_upstream(fixed, ttl))
+            except Exception:
+                # The agent may still answer after a failed tool (e.g. if errors
+                # are handed back to it as observations) — that answer is degraded too
+                _mark_degraded(tool_name)
+                raise
+            if fetched_at is None:
+                _mark_degraded(tool_name)
+            else:
+                _record_result(fetched_at, ttl)
+            return result
+
+        async def call_upstream(fixed: dict[str, Any], ttl: int) -> tuple[Any, float | None]:
+            """Returns (result, fetched_at), fetched_at being None for a stale
+            fallback — it reaches every coalesced caller, not just the one whose
+            context ran the call."""
+            # ── 3. Circuit breaker check ──
             if circuit_breaker.is_open(tool_name):
                 logger.error(
                     f"[TOOL:{tool_name}] BLOCKED by circuit breaker — "
@@ -286,16 +499,16 @@ def wrap_tool(tool: StructuredTool) -> StructuredTool:
                 )
                 # Try stale cache as fallback before raising
                 if ttl > 0:
-                    stale = tool_cache.get_stale(tool_name, fixed)
+                    stale = await tool_cache.get_stale(tool_name, fixed)
                     if stale is not None:
-                        return stale
+                        return stale, None
                 raise RuntimeError(
                     f"The {tool_name} service is temporarily unavailable due to repeated failures. "
                     f"It will be re-enabled automatically in a few minutes. "
                     f"Please try again later."
                 )
 
-            # ── 3. Call MCP server with retry + timeout ──
+            # ── 4. Call MCP server with retry + timeout ──
             last_err = None
             max_retries = settings.TOOL_CALL_RETRIES
 
@@ -320,9 +533,9 @@ def wrap_tool(tool: StructuredTool) -> StructuredTool:
 
                     # Store in cache
                     if ttl > 0:
-                        tool_cache.put(tool_name, fixed, result)
+                        await tool_cache.put(tool_name, fixed, result)
 
-                    return result
+                    return result, time.time()
 
                 except asyncio.TimeoutError:
                     elapsed = time.monotonic() - start
@@ -350,7 +563,7 @@ def wrap_tool(tool: StructuredTool) -> StructuredTool:
                     )
                     await asyncio.sleep(backoff)
 
-            # ── 4. All retries exhausted — try stale cache as fallback ──
+            # ── 5. All retries exhausted — try stale cache as fallback ──
             logger.error(
                 f"[TOOL:{tool_name}] ALL {max_retries} RETRIES EXHAUSTED — "
                 f"last error: {type(last_err).__name__}: {last_err}"
@@ -358,13 +571,13 @@ def wrap_tool(tool: StructuredTool) -> StructuredTool:
             circuit_breaker.record_failure(tool_name)
 
             if ttl > 0:
-                stale = tool_cache.get_stale(tool_name, fixed)
+                stale = await tool_cache.get_stale(tool_name, fixed)
                 if stale is not None:
                     logger.info(
                         f"[TOOL:{tool_name}] Returning stale cache as fallback "
                         f"after all retries failed"
                     )
-                    return stale
+                    return stale, None
 
             raise last_err  # type: ignore[misc]
 
@@ -1,8 +1,8 @@
 import client from './client';
 
-export function getMessages(symbol, { limit = 50, before } = {}) {
+export function getMessages(symbol, { limit = 50, cursor } = {}) {
   const params = { limit };
-  if (before) params.before = before;
+  if (cursor) params.cursor = cursor;
   return client.get(`/api/chat/${encodeURIComponent(symbol)}/messages`, { params });
 }
 
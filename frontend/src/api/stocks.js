@@ -1,11 +1,19 @@
 import client from './client';
+import { WS_URL } from '../utils/constants';
 
 export function getStockQuote(symbol) {
   return client.get(`/api/stocks/${encodeURIComponent(symbol)}/quote`);
 }
 
-export function getStockFundamentals(symbol) {
-  return client.get(`/api/stocks/${encodeURIComponent(symbol)}/fundamentals`);
+export function getStockQuotes(symbols) {
+  return client.get('/api/stocks/quotes', { params: { symbols: symbols.join(',') } });
+}
+
+// fields: optional array of dotted paths (e.g. ['info.trailingPE']) to fetch only part of the payload
+export function getStockFundamentals(symbol, fields) {
+  return client.get(`/api/stocks/${encodeURIComponent(symbol)}/fundamentals`, {
+    params: fields?.length ? { fields: fields.join(',') } : undefined,
+  });
 }
 
 export function getStockNews(symbol, stockName, limit = 10) {
@@ -13,3 +21,22 @@ export function getStockNews(symbol, stockName, limit = 10) {
     params: { stock_name: stockName, limit },
   });
 }
+
+/**
+ * Open a quote stream. Call subscribe/unsubscribe with arrays of symbols;
+ * onMessage receives {type: 'quote', symbol, quote} and {type: 'error', ...}.
+ */
+export function openQuoteStream(sessionId, onMessage) {
+  const ws = new WebSocket(`${WS_URL}/api/stocks/stream?session_id=${encodeURIComponent(sessionId)}`);
+  ws.onmessage = (event) => onMessage(JSON.parse(event.data));
+  const send = (type, symbols) => {
+    const payload = JSON.stringify({ type, symbols });
+    if (ws.readyState === WebSocket.OPEN) ws.send(payload);
+    else ws.addEventListener('open', () => ws.send(payload), { once: true });
+  };
+  return {
+    subscribe: (symbols) => send('subscribe', symbols),
+    unsubscribe: (symbols) => send('unsubscribe', symbols),
+    close: () => ws.close(),
+  };
+}
@@ -1,7 +1,7 @@
 import client from './client';
 
-export function getWatchlist() {
-  return client.get('/api/watchlist/');
+export function getWatchlist({ includeQuotes = false } = {}) {
+  return client.get('/api/watchlist/', { params: includeQuotes ? { include: 'quote' } : {} });
 }
 
 export function addToWatchlist(symbol, stock_name) {
@@ -12,6 +12,14 @@ export function removeFromWatchlist(symbol) {
   return client.delete(`/api/watchlist/${encodeURIComponent(symbol)}`);
 }
 
+export function bulkAddToWatchlist(items) {
+  return client.post('/api/watchlist/bulk', { items });
+}
+
+export function bulkRemoveFromWatchlist(symbols) {
+  return client.post('/api/watchlist/bulk/remove', { symbols });
+}
+
 export function searchStocks(query) {
   return client.get('/api/watchlist/search', { params: { q: query } });
 }